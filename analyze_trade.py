@@ -1,21 +1,102 @@
 
 import logging
+import logging.handlers
+import sys
 from dhan_api_helper import get_dhan_session, load_dhan_instrument_map, fetch_candle_data
-from indicators import calculate_indicators, check_buy_condition, check_15m_bias
+from indicators import calculate_indicators
 import pandas as pd
-from datetime import datetime
+import numpy as np
+import os
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+try:
+    import pyarrow  # noqa: F401 (parquet engine for the candle cache)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 # Setup simple logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Report output is buffered and written to stdout in one go per analyze_trade() call
+# (flushed on exit, or early on errors / when the buffer fills up)
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setFormatter(logging.Formatter("%(message)s"))
+_report_buffer = logging.handlers.MemoryHandler(capacity=64, flushLevel=logging.ERROR, target=_stdout_handler)
+logger.addHandler(_report_buffer)
+logger.propagate = False
+
+# --- Candle Cache ---
+# Post-indicator frames are cached per (symbol, timeframe) and reused once the
+# cached data already contains today's session close. Set BYPASS_CACHE=1 to always refetch.
+CACHE_DIR = "cache"
+INTERVAL_MINUTES = {"FIVE_MINUTE": 5, "FIFTEEN_MINUTE": 15}
+SESSION_CLOSE_UTC = pd.Timedelta(hours=10)  # 15:30 IST
+
+def add_bias_column(df):
+    """Classifies every 15M candle once: BULLISH / BEARISH (vs VWAP + EMA20), else NEUTRAL (N/A if no close)."""
+    if df is not None and 'bias' not in df.columns:
+        df['bias'] = np.select(
+            [
+                (df['close'] > df['VWAP']) & (df['close'] > df['EMA_20']),
+                (df['close'] < df['VWAP']) & (df['close'] < df['EMA_20']),
+                df['close'].isna()
+            ],
+            ['BULLISH', 'BEARISH', 'N/A'],
+            default='NEUTRAL'
+        )
+    return df
+
+def load_cached(dhan, token, symbol, interval, days=3):
+    """
+    Returns candles with indicators for `symbol`, served from the parquet cache
+    when the cached data already covers today's session close.
+    """
+    use_cache = HAS_PYARROW and os.environ.get("BYPASS_CACHE") != "1"
+    path = os.path.join(CACHE_DIR, f"{symbol}_{interval}.parquet")
+
+    if use_cache and os.path.exists(path):
+        try:
+            df = pd.read_parquet(path, engine="pyarrow")
+            # Candle datetimes are naive UTC (from epoch)
+            last_ts = df['datetime'].iloc[-1]
+            session_close = pd.Timestamp(datetime.now(timezone.utc).date()) + SESSION_CLOSE_UTC
+            if last_ts + pd.Timedelta(minutes=INTERVAL_MINUTES[interval]) >= session_close:
+                logger.info(f"Cache hit: {path} (last candle {last_ts})")
+                # Older cache files predate the stored 15M bias column
+                return add_bias_column(df) if interval == "FIFTEEN_MINUTE" else df
+        except Exception as e:
+            logger.warning(f"Cache read failed for {path}: {e}")
+
+    df = fetch_candle_data(dhan, token, symbol, interval, days=days)
+    df = calculate_indicators(df)
+    if interval == "FIFTEEN_MINUTE":
+        df = add_bias_column(df)  # persisted with the cached frame
+
+    if use_cache and df is not None:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            df.to_parquet(path, engine="pyarrow", compression="zstd", index=False)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {path}: {e}")
+
+    return df
+
 def analyze_trade(symbol):
-    print(f"--- Analyzing {symbol} ---")
+    try:
+        _analyze_trade(symbol)
+    finally:
+        _report_buffer.flush()
+
+def _analyze_trade(symbol):
+    logger.info(f"--- Analyzing {symbol} ---")
     
     # 1. Login
     dhan = get_dhan_session()
     if not dhan:
-        print("Login failed.")
+        logger.error("Login failed.")
         return
 
     # 2. Get Token
@@ -25,43 +106,44 @@ def analyze_trade(symbol):
     token = token_map.get(f"{symbol}-EQ") or token_map.get(symbol)
     
     if not token:
-        print(f"Token not found for {symbol}")
+        logger.error(f"Token not found for {symbol}")
         # Debug: print some keys
-        # print(list(token_map.keys())[:10])
+        # logger.info(list(token_map.keys())[:10])
         return
     else:
-        print(f"Token: {token}")
+        logger.info(f"Token: {token}")
 
-    # 3. Fetch Data (15M and 5M)
-    print("Fetching 15M Data...")
-    df_15m = fetch_candle_data(dhan, token, symbol, "FIFTEEN_MINUTE", days=3)
-    
-    print("Fetching 5M Data...")
-    df_5m = fetch_candle_data(dhan, token, symbol, "FIVE_MINUTE", days=3)
+    # 3. Fetch Data (15M and 5M) + 4. Calculate Indicators
+    # Both fetches share the dhan session's keep-alive pool and run concurrently.
+    logger.info("Fetching 15M + 5M Data...")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        future_15m = pool.submit(load_cached, dhan, token, symbol, "FIFTEEN_MINUTE", 3)
+        future_5m = pool.submit(load_cached, dhan, token, symbol, "FIVE_MINUTE", 3)
+        df_15m = future_15m.result()
+        df_5m = future_5m.result()
 
     if df_15m is None or df_5m is None:
-        print("Failed to fetch data.")
+        logger.error("Failed to fetch data.")
         return
-
-    # 4. Calculate Indicators
-    df_15m = calculate_indicators(df_15m)
-    df_5m = calculate_indicators(df_5m)
     
-    print(f"5M Data Count: {len(df_5m)}")
-    print(f"5M Data Start: {df_5m['datetime'].min()}")
-    print(f"5M Data End: {df_5m['datetime'].max()}")
+    # Volume spike threshold (1.5x Avg) as a column, used by the vectorized checks below
+    df_5m['Volume_Threshold'] = df_5m['Volume_SMA_20'] * 1.5
+    
+    logger.info(f"5M Data Count: {len(df_5m)}")
+    logger.info(f"5M Data Start: {df_5m['datetime'].min()}")
+    logger.info(f"5M Data End: {df_5m['datetime'].max()}")
 
     # 5. Analyze the last few candles (focusing on late session)
 
     # 5. Analyze the specific candle that would trigger a 15:13 signal (i.e. 15:10 candle)
-    print("\n--- Specifc Analysis for 15:10 Candle ---")
+    logger.info("\n--- Specifc Analysis for 15:10 Candle ---")
     
     # Convert entire DF to IST for easier filtering
     # Assuming 'datetime' is naive UTC (from epoch)
-    df_5m['datetime'] = df_5m['datetime'].dt.tz_localize('UTC').dt.tz_convert('Asia/Kolkata')
-    df_15m['datetime'] = df_15m['datetime'].dt.tz_localize('UTC').dt.tz_convert('Asia/Kolkata')
+    # Localize the raw datetime64 buffer directly (no intermediate Series)
+    df_5m['datetime'] = pd.DatetimeIndex(df_5m['datetime'].to_numpy(), tz='UTC').tz_convert('Asia/Kolkata')
+    df_15m['datetime'] = pd.DatetimeIndex(df_15m['datetime'].to_numpy(), tz='UTC').tz_convert('Asia/Kolkata')
     
-    target_time_str = "15:10"
     # Find the row where time component matches 15:05 or 15:10?
     # Trade at 15:13 implied analysis of 15:10 closed candle? 
     # Or 15:05 closed candle? 
@@ -73,61 +155,59 @@ def analyze_trade(symbol):
     # So we should check the 15:05 candle!
     
     # Target 15:00, 15:05, 15:10 (IST) for TODAY
-    today = datetime.now().date()
+    # Midnight IST today; normalize() compares on the datetime64 buffer (no per-row date objects)
+    today_ts = pd.Timestamp.now(tz='Asia/Kolkata').normalize()
+    dt_5m = df_5m['datetime'].dt
     subset = df_5m[
-        (df_5m['datetime'].dt.date == today) & 
-        (df_5m['datetime'].dt.strftime('%H:%M') == '15:05')
+        (dt_5m.normalize() == today_ts) & 
+        (dt_5m.hour == 15) & (dt_5m.minute == 5)
     ]
     
-    print(f"Found {len(subset)} candles matching target times for {today}.")
+    logger.info(f"Found {len(subset)} candles matching target times for {today_ts.date()}.")
     
-    results = []
-    
-    for i, row in subset.iterrows():
-        time_str = row['datetime'].strftime("%Y-%m-%d %H:%M:%S")
-        close = row['close']
-        vwap = row.get('VWAP')
-        ema = row.get('EMA_20')
-        vol = row['volume']
-        vol_sma = row.get('Volume_SMA_20')
-        
-        # 15M Bias Logic
-        bias_15m = "N/A"
-        # Approximate 15M candle (14:45 for 15:05/15:10 timestamps)
-        latest_15m_idx = df_15m[df_15m['datetime'] <= row['datetime']].index[-1]
-        bias_candle = df_15m[df_15m['datetime'].dt.strftime('%H:%M') == '14:45']
-        
-        if not bias_candle.empty:
-            b_row = bias_candle.iloc[0]
-            if b_row['close'] > b_row['VWAP'] and b_row['close'] > b_row['EMA_20']: bias_15m = "BULLISH"
-            elif b_row['close'] < b_row['VWAP'] and b_row['close'] < b_row['EMA_20']: bias_15m = "BEARISH"
-            else: bias_15m = "NEUTRAL"
-            
-        # Logic Check
-        is_green = row['close'] > row['open']
-        above_levels = close > vwap and close > ema
-        vol_spike = vol > (vol_sma * 1.5) if vol_sma else False
-        
-        reasons = []
-        if not is_green: reasons.append("Red Candle")
-        if not above_levels: reasons.append("Below Levels")
-        # if not vol_spike: reasons.append(f"Low Volume ({vol} < {int(vol_sma*1.5)})")
-        if not vol_spike: reasons.append("Low Volume")
-        if bias_15m != "BULLISH": reasons.append(f"Bias {bias_15m}")
-        
-        verdict = "VALID" if not reasons else f"INVALID: {', '.join(reasons)}"
-        
-        results.append({
-            "time": time_str,
-            "verdict": verdict,
-            "price": close,
-            "vol": vol,
-            "vol_req": vol_sma * 1.5 if vol_sma else 0,
-            "bias": bias_15m
-        })
+    # 15M Bias Logic
+    # Attach the last COMPLETED 15M candle to each 5M row (14:45 for 15:05/15:10 timestamps).
+    # A 15M candle is complete once 15 minutes have elapsed since its start.
+    # The bias itself is a precomputed column on df_15m (see add_bias_column); only look it up here.
+    df_15m_sorted = df_15m[['datetime', 'bias']].sort_values('datetime')
+    subset = pd.merge_asof(
+        subset.sort_values('datetime').assign(bias_ts=lambda d: d['datetime'] - pd.Timedelta(minutes=15)),
+        df_15m_sorted.rename(columns={'datetime': 'bias_ts'}),
+        on='bias_ts',
+        direction='backward'
+    )
+
+    # No completed 15M candle before the row -> N/A
+    bias_series = subset['bias'].fillna('N/A')
+
+    # Logic Check (vectorized over all matching candles)
+    close = subset['close']
+    vol_req = subset['Volume_Threshold'].fillna(0)
+
+    is_green = (close > subset['open']).to_numpy()
+    above_levels = ((close > subset['VWAP']) & (close > subset['EMA_20'])).to_numpy()
+    vol_spike = (subset['volume'] > subset['Volume_Threshold']).to_numpy() # NaN threshold -> False
+    bias_ok = (bias_series == "BULLISH").to_numpy()
+
+    reasons = np.char.add(np.where(is_green, "", "Red Candle, "), np.where(above_levels, "", "Below Levels, "))
+    reasons = np.char.add(reasons, np.where(vol_spike, "", "Low Volume, "))
+    reasons = np.char.add(reasons, np.where(bias_ok, "", np.char.add(np.char.add("Bias ", bias_series.to_numpy().astype(str)), ", ")))
+    reasons = pd.Series(reasons, index=subset.index, dtype=object).str.rstrip(", ")
+
+    verdict = np.where(reasons == "", "VALID", "INVALID: " + reasons)
+
+    # Emit records straight from a frame holding only the output columns
+    # (no copy of the full indicator frame, no per-row dict building)
+    results = pd.DataFrame({
+        "time": subset['datetime'].dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "verdict": verdict,
+        "price": close,
+        "vol": subset['volume'],
+        "vol_req": vol_req,
+        "bias": bias_series
+    }).to_dict(orient='records')
         
-    import json
-    print("JSON_RESULT:" + json.dumps(results))
+    logger.info("JSON_RESULT:" + orjson.dumps(results, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY).decode())
 
 
 if __name__ == "__main__":
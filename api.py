@@ -1,5 +1,6 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
 import threading
@@ -15,7 +16,7 @@ from main import (
 )
 from config import config_manager
 from ws_hub import manager
-from state_manager import save_state, state_lock
+from state_manager import save_state, state_lock, get_state_snapshot
 from datetime import datetime
 
 # Configure Logging
@@ -34,7 +35,7 @@ async def start_order_update_ws():
     """
     logger.info("Waiting for Dhan API Session to initialize...")
     while True:
-        if getattr(main, 'DHAN_API_SESSION', None): # Check connectivity (Dhan object exists)
+        if main.SESSION_READY: # Set once by the bot after Dhan login
             # Get IDs from config
             client_id = config_manager.get("credentials", "dhan_client_id")
             access_token = config_manager.get("credentials", "dhan_access_token")
@@ -62,12 +63,15 @@ async def lifespan(app: FastAPI):
     # Start Order WS Background Task
     asyncio.create_task(start_order_update_ws())
     
+    # Start Keep-Alive (Render Free Tier) on the same loop
+    asyncio.create_task(keep_alive())
+    
     yield  # Application runs here
     
     # Cleanup on shutdown (if needed)
     logger.info("Shutting down bot...")
 
-app = FastAPI(title="IntradayScreener Bot API v2.0", lifespan=lifespan)
+app = FastAPI(title="IntradayScreener Bot API v2.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -120,8 +124,9 @@ def read_root():
     return {"status": "Device Online", "service": "IntradayScreener Bot v2.0"}
 
 @app.get("/data")
-def get_bot_data():
-    return BOT_STATE
+async def get_bot_data():
+    # Lock-free read of the latest published snapshot (never the live dict)
+    return dict(get_state_snapshot())
 
 @app.get("/config")
 def get_config():
@@ -130,11 +135,8 @@ def get_config():
 @app.post("/config")
 def update_config(config: FullConfig):
     try:
-        config_manager.update("risk", config.risk.dict())
-        config_manager.update("limits", config.limits.dict())
-        config_manager.update("general", config.general.dict())
-        config_manager.update("position_sizing", config.position_sizing.dict())
-        config_manager.update("credentials", config.credentials.dict())
+        # Merge all sections and persist once (local file + Supabase)
+        config_manager.update_bulk(config.dict())
         return {"status": "success", "message": "Config updated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -146,8 +148,11 @@ def toggle_trading():
         save_state(BOT_STATE)
     return {"status": "success", "is_trading_allowed": BOT_STATE["is_trading_allowed"]}
 
-@app.post("/trade/close/{symbol}")
-async def close_position(symbol: str):
+def _close_position_sync(symbol: str):
+    """
+    Blocking part of a manual close (state_lock, order placement, DB logging).
+    Returns the updated position.
+    """
     with state_lock:
         if symbol not in BOT_STATE["positions"]:
             raise HTTPException(status_code=404, detail="Position not found")
@@ -156,15 +161,17 @@ async def close_position(symbol: str):
         if pos["status"] != "OPEN":
             raise HTTPException(status_code=400, detail="Position already closed")
         
+        if not main.SESSION_READY:
+            raise HTTPException(status_code=503, detail="Broker session not ready")
+        
         # Get token from instrument map
-        from main import TOKEN_MAP, SMART_API_SESSION
-        token = TOKEN_MAP.get(symbol)
+        token = main.TOKEN_MAP.get(symbol)
         if not token:
             raise HTTPException(status_code=500, detail="Token not found")
         
         # Place sell order
         try:
-            place_sell_order(SMART_API_SESSION, symbol, token, pos['qty'], reason="MANUAL_CLOSE")
+            place_sell_order(main.DHAN_API_SESSION, symbol, token, pos['qty'], reason="MANUAL_CLOSE")
             
             # Update State
             current_ltp = pos.get('current_ltp', 0.0)
@@ -183,15 +190,20 @@ async def close_position(symbol: str):
             log_trade_execution(pos, current_ltp, "MANUAL_CLOSE", leverage)
             
             save_state(BOT_STATE)
-            
-            # Broadcast Update
-            from ws_hub import manager
-            await manager.broadcast(BOT_STATE)
-            
-            return {"status": "success", "message": f"Closed {symbol}"}
+            return dict(pos)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/trade/close/{symbol}")
+async def close_position(symbol: str):
+    # Run the locking/blocking work in a worker thread so the event loop never waits on state_lock
+    pos = await asyncio.to_thread(_close_position_sync, symbol)
+    
+    # Broadcast Update (only the closed position changed)
+    await manager.broadcast_patch(["positions", symbol], pos)
+    
+    return {"status": "success", "message": f"Closed {symbol}"}
+
 @app.post("/restart")
 def restart_server():
     """
@@ -211,20 +223,19 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # Send Heartbeat Ping every 15s to keep connection alive
+            # Park on the socket until the client speaks or disconnects (no polling wakeups).
+            # If it stays quiet for 15s, send a Heartbeat Ping to keep the connection alive
             # Fixing 'connection close' issue on cloud providers (AWS/Render)
-            await asyncio.sleep(15)
             try:
+                await asyncio.wait_for(websocket.receive_text(), timeout=15)
+            except asyncio.TimeoutError:
                 await websocket.send_json({"type": "ping", "timestamp": str(datetime.now())})
-            except Exception as e:
-                # If send fails, client is gone. Break loop to trigger disconnect.
-                logger.debug(f"WS Ping Failed: {e}")
-                break
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
-        logger.error(f"WS Endpoint Error: {e}")
+        # If send fails, client is gone.
+        logger.debug(f"WS Endpoint Closed: {e}")
         manager.disconnect(websocket)
 
 # --- Journal / History ---
@@ -248,14 +259,13 @@ async def get_trade_history_api():
 # Keep-Alive (Render Free Tier)
 # ----------------------------------
 
-def start_keep_alive():
+async def keep_alive():
     """
     Pings the application's own URL every 10 minutes to prevent Render from sleeping.
     Relies on RENDER_EXTERNAL_URL environment variable.
+    Runs as a task on the server's event loop (no extra thread).
     """
-    import time
-    import requests
-    import os
+    import httpx
     
     url = os.environ.get("RENDER_EXTERNAL_URL")
     if not url:
@@ -264,22 +274,16 @@ def start_keep_alive():
 
     logger.info(f"Keep-Alive: Starting self-ping for {url}")
     
-    def loop():
+    async with httpx.AsyncClient(timeout=30) as client:
         while True:
-            time.sleep(600) # 10 Minutes
+            await asyncio.sleep(600) # 10 Minutes
             try:
                 # Ping root or a health endpoint
-                r = requests.get(f"{url}/")
+                r = await client.get(f"{url}/")
                 logger.info(f"Keep-Alive Ping: {r.status_code}")
             except Exception as e:
                 logger.error(f"Keep-Alive Failed: {e}")
-                
-    t = threading.Thread(target=loop, daemon=True)
-    t.start()
 
 if __name__ == "__main__":
-    # Start Keep-Alive before server
-    start_keep_alive()
-    
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -1,11 +1,17 @@
 import asyncio
 import aiohttp
 import logging
+import time
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
 import pandas as pd
+import orjson
 from datetime import datetime
-from indicators import calculate_indicators, check_buy_condition
+from indicators import calculate_indicators, check_15m_bias, evaluate_entry
 from utils import get_ist_now
-from dhan_api_helper import fetch_candle_data, fetch_ltp
+from dhan_api_helper import fetch_candle_data, fetch_ltp, build_intraday_request, candles_to_frame, intraday_date_range, data_limiter
 
 logger = logging.getLogger("AsyncScanner")
 # Ensure logging output matches MainBot
@@ -16,63 +22,213 @@ if not logger.handlers:
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
 
+# Market regime memo: (15M candle bucket, extension limit). The sentinel's ranges come from
+# 15M candles, so one decision is reused by every scan within the same IST 15-minute candle.
+# Module level so it outlives any one AsyncScanner instance. Only completed regime decisions are cached.
+SENTIMENT_BUCKET_MINUTES = 15
+_sentiment_cache = (None, None)
+
+def _sentiment_bucket():
+    """Current IST 15-minute candle, as (date, hour, minute // 15)."""
+    now = get_ist_now()
+    return now.date(), now.hour, now.minute // SENTIMENT_BUCKET_MINUTES
+
+# Indicator memo: consecutive scans mostly see the same bars (a 15M candle only rolls every
+# 15 min), so post-indicator frames are reused while the candle data is unchanged.
+# Keyed by symbol + timeframe + a fingerprint of the bars (count, first/last candle and the
+# forming candle's close/volume, which keep updating until it rolls).
+# In-memory only: the forming candle makes most live keys new, so a disk tier would mostly
+# add a blocking write per symbol on the scan loop.
+INDICATOR_CACHE_SIZE = 4096
+_indicator_cache = OrderedDict()
+
+def cached_indicators(symbol, timeframe, df):
+    """calculate_indicators(df), reused from the memo when the bars are unchanged."""
+    if df is None or df.empty:
+        return calculate_indicators(df)
+    
+    times = df['datetime'].to_numpy()
+    key = (symbol, timeframe, len(df), times[0], times[-1], df['close'].to_numpy()[-1], df['volume'].to_numpy()[-1])
+    
+    cached = _indicator_cache.get(key)
+    if cached is not None:
+        _indicator_cache.move_to_end(key)
+        return cached
+    
+    result = calculate_indicators(df)
+    if result is not None:
+        _indicator_cache[key] = result
+        if len(_indicator_cache) > INDICATOR_CACHE_SIZE:
+            _indicator_cache.popitem(last=False)
+    return result
+
+class AsyncRateLimiter:
+    """
+    Async counterpart of dhan_api_helper.RateLimiter: spaces out acquisitions
+    by a minimum interval without blocking the event loop.
+    Each caller reserves the next free slot and sleeps outside the lock, so the
+    cadence stays at exactly `calls_per_second` (no drift from sleep overshoot).
+    """
+    def __init__(self, calls_per_second=1.0):
+        self.interval = 1.0 / calls_per_second
+        self.next_slot = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class AdmissionController:
+    """
+    Concurrency limit for candle fetches (used like asyncio.Semaphore via `async with`).
+    Unlike a Semaphore, the limit can be changed while tasks are waiting, e.g. shrunk
+    when Dhan answers with DH-904 / 429.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify(1)
+
+    async def set_limit(self, limit):
+        async with self.cond:
+            raised = limit > self.limit
+            self.limit = limit
+            if raised:
+                self.cond.notify_all()
+
 class AsyncScanner:
-    def __init__(self, jwt_token, smartApi=None, concurrency=50, timeout=3):
+    def __init__(self, jwt_token, smartApi=None, concurrency=50, timeout=3, cpu_workers=None):
         self.jwt_token = jwt_token
         self.smartApi = smartApi # Store Dhan Object
+        # 5M indicator/entry checks run inline unless a process pool (> 1 worker) is configured.
+        # Opt-in only: spawned workers re-import the entry script (api.py -> main.py), whose
+        # import-time state load/auto-save would then run once per worker.
+        self.cpu_workers = cpu_workers if cpu_workers is not None else 1
+        self.cpu_pool = None
         # self.api_key = API_KEY # Obsolete
         # self.client_code = CLIENT_CODE # Obsolete
         self.concurrency = concurrency 
-        self.sem = None 
+        self.admission = None # Fetch concurrency limit (AdmissionController)
+        self.limiter = None # Fetch start rate limiter
+        self._sync_loop = None # Loop the admission controller/limiters above are bound to
+        self.executor = None # Dedicated fetch pool, created per scan
+        self.date_range = None # (fromDate, toDate) for candle requests, computed once per scan
         self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None # Persistent aiohttp session (kept across scans on the same loop)
+        self.candle_timeout = aiohttp.ClientTimeout(total=15) # Candle payloads are slower than the sentiment ping
         self.base_url = "https://api.dhan.co" # Updated
         self.endpoint = "" # Not used with SDK
         
         # Headers not needed for SDK wrapper, but kept empty for safety if logic checks it
         self.headers = {}
 
+    async def _get_session(self):
+        """
+        Returns the shared aiohttp session, creating it on first use.
+        Keeps the TCP/TLS pool warm between scans (brkpoint.in etc).
+        Responses are compressed on the wire: aiohttp sends Accept-Encoding (gzip, deflate,
+        plus br when Brotli is installed) and decompresses transparently.
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(
+                    limit=self.concurrency, ttl_dns_cache=300, keepalive_timeout=75,
+                    # Reap half-closed TLS transports (only needed on Pythons without the asyncio fix)
+                    enable_cleanup_closed=getattr(aiohttp.connector, "NEEDS_CLEANUP_CLOSED", True)
+                )
+            )
+        return self._session
+
+    async def aclose(self):
+        """Closes the shared aiohttp session and the CPU pool (call on shutdown, on the scan loop)."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.cpu_pool is not None:
+            self.cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self.cpu_pool = None
+
+    def _get_cpu_pool(self):
+        """Returns the process pool for evaluate_entry, or None to evaluate inline."""
+        if self.cpu_pool is None and self.cpu_workers > 1:
+            try:
+                # 'spawn': the bot runs in a threaded server process, where forking is unsafe
+                self.cpu_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.cpu_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            except Exception as e:
+                logger.warning(f"CPU pool unavailable, evaluating inline: {e}")
+                self.cpu_workers = 1
+        return self.cpu_pool
+
+    async def _evaluate_entry(self, symbol, df_5m, extension_limit):
+        """
+        Runs evaluate_entry for a fetched 5M frame on the CPU pool (or inline on a single core).
+        Processing errors are returned as stage 'ERROR'.
+        """
+        try:
+            pool = self._get_cpu_pool()
+            if pool is not None:
+                loop = asyncio.get_running_loop()
+                try:
+                    return await loop.run_in_executor(pool, evaluate_entry, df_5m, extension_limit)
+                except BrokenProcessPool as e:
+                    logger.error(f"CPU pool broken, evaluating inline from now on: {e}")
+                    self.cpu_pool = None
+                    self.cpu_workers = 1
+            
+            # Inline path can use the indicator memo
+            return evaluate_entry(cached_indicators(symbol, "FIVE_MINUTE", df_5m), extension_limit)
+        except Exception as e:
+            return 'ERROR', str(e), None, None
+
     async def fetch_candle_data(self, session, symbol, token):
         """
-        Delegates data fetching to the robust smart_api_helper function.
-        Run in ThreadPoolExecutor because smartApi.getCandleData is blocking.
+        Fetches 15M candles, then 5M candles if the 15M bias is BULLISH.
+        Candles come straight from Dhan's REST API over the shared aiohttp session (_post_candles).
         """
-        # We don't use 'session' (aiohttp) anymore, we use self.smartApi (SmartConnect Object)
         if not self.smartApi:
             logger.error(f"❌ [Async] SmartAPI Object missing for {symbol}")
             return symbol, None
 
-        loop = asyncio.get_running_loop()
-        
         try:
-            # Call the Verified Helper Function (Blocking)
-            # Fetch BOTH 15M (bias) and 5M (entry) for multi-timeframe confluence
-            loop = asyncio.get_event_loop()
+            # Multi-timeframe confluence: 15M (bias) gates the 5M (entry) fetch.
+            # Most symbols fail the 15M bias, so their 5M request is never issued (DH-904 budget).
             
             # Fetch 15M for trend bias/direction
-            df_15m = await loop.run_in_executor(
-                None, 
-                fetch_candle_data, 
-                self.smartApi, 
-                token, 
-                symbol, 
-                "FIFTEEN_MINUTE",
-                5
-            )
+            df_15m = await self._post_candles(session, token, symbol, "FIFTEEN_MINUTE", 5)
+            if df_15m is None:
+                return symbol, None
+            
+            # Step 1: Check 15M Bias (The Golden Rule)
+            df_15m = cached_indicators(symbol, "FIFTEEN_MINUTE", df_15m)
+            bias_15m, bias_reason = check_15m_bias(df_15m)
+            if bias_15m != 'BULLISH':
+                # No 5M needed; df_5m=None marks a bias rejection
+                return symbol, (df_15m, None, bias_reason)
             
             # Fetch 5M for precise entry signal
-            df_5m = await loop.run_in_executor(
-                None, 
-                fetch_candle_data, 
-                self.smartApi, 
-                token, 
-                symbol, 
-                "FIVE_MINUTE",
-                5
-            )
+            df_5m = await self._post_candles(session, token, symbol, "FIVE_MINUTE", 5)
             
-            if df_15m is not None and df_5m is not None:
-                # Return both as tuple
-                return symbol, (df_15m, df_5m)
+            if df_5m is not None:
+                # Return both as tuple (15M already has indicators)
+                return symbol, (df_15m, df_5m, bias_reason)
             
             return symbol, None
 
@@ -81,15 +237,77 @@ class AsyncScanner:
             return symbol, None
 
 
-    async def bounded_fetch(self, session, symbol, token):
-        async with self.sem:
-            return await self.fetch_candle_data(session, symbol, token)
+    async def _post_candles(self, session, token, symbol, interval, days):
+        """
+        Async port of dhan_api_helper.fetch_candle_data: POSTs to Dhan's V2 `charts/intraday`
+        on the aiohttp session, so an in-flight request holds a socket instead of a worker thread.
+        Falls back to the blocking SDK call (on the fetch pool) if the Dhan object exposes no auth header.
+        """
+        headers = getattr(self.smartApi, 'header', None)
+        if not headers:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, fetch_candle_data, self.smartApi, token, symbol, interval, days
+            )
+        
+        request = build_intraday_request(token, symbol, interval, days, date_range=self.date_range)
+        url = f"{self.base_url}/v2/charts/intraday"
+        
+        # Rate Limit (Data API): shares dhan_api_helper.data_limiter with the SDK fetches
+        # on bot threads, so both paths together stay within one 2 req/s budget
+        delay = data_limiter.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        try:
+            # Body pre-serialized with orjson (Dhan's header already carries Content-type: application/json)
+            async with session.post(url, data=orjson.dumps(request), headers=headers, timeout=self.candle_timeout) as response:
+                # Parse the raw body with orjson (skips aiohttp's text decode + json.loads)
+                raw = await response.read()
+                data = orjson.loads(raw) if raw else None
+                if response.status == 429 or (isinstance(data, dict) and data.get("errorCode") == "DH-904"):
+                    # Rate limited: back off fetch concurrency (recovers one slot per scan)
+                    new_limit = max(1, self.admission.limit - 1)
+                    if new_limit < self.admission.limit:
+                        logger.warning(f"Dhan rate limit (DH-904) on {symbol}: fetch concurrency -> {new_limit}")
+                        await self.admission.set_limit(new_limit)
+                if response.status != 200 or not data:
+                    logger.warning(f"Candle Fetch Failed for {symbol}. Response: {data}")
+                    return None
+            return candles_to_frame(data, symbol, interval)
+        except Exception as e:
+            logger.error(f"Error fetching candles (Dhan) for {symbol}: {e}")
+            return None
+
+    async def bounded_fetch(self, session, stock, token, sentiment_task):
+        # Carry the stock dict + token through so the consumer needs no lookup back into stocks_list/token_map
+        async with self.admission:
+            # Dhan Rate Limit is aggressive for historical data (DH-904): cap fetch starts
+            await self.limiter.wait()
+            _, data = await self.fetch_candle_data(session, stock['symbol'], token)
+        
+        # 5M checks run after the fetch slot is released, on the CPU pool
+        if data is not None and data[1] is not None:
+            df_15m, df_5m, bias_reason = data
+            extension_limit = await sentiment_task
+            evaluation = await self._evaluate_entry(stock['symbol'], df_5m, extension_limit)
+            data = (df_15m, df_5m, bias_reason, evaluation)
+        elif data is not None:
+            data = data + (None,)
+        return stock, token, data
 
     async def check_market_sentiment(self, session, index_memory=None):
         """
         Checks if Market (Nifty + BankNifty) is Bullish.
         Uses 'brkpoint.in' API for reliable Sentinel Data.
+        Result is reused until the current 15-minute candle closes.
         """
+        global _sentiment_cache
+        bucket = _sentiment_bucket()
+        cached_bucket, cached_value = _sentiment_cache
+        if cached_value is not None and cached_bucket == bucket:
+            return cached_value
+        
         bullish_count = 0
         endpoint = "https://brkpoint.in/api/indexscan"
         today_date = datetime.now().date().isoformat()
@@ -170,159 +388,190 @@ class AsyncScanner:
         
         # Final Decision
         if bullish_count == 2:
-            logger.info(f"[REGIME] {' '.join(regime_details)} -> TREND_MODE (EXT=1.5)")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"[REGIME] {' '.join(regime_details)} -> TREND_MODE (EXT=1.5)")
+            _sentiment_cache = (bucket, 1.5)
             return 1.5
         else:
             # Stricter Safety Mode to avoid chasing (0.8%)
             reason = "WEAK_RANGE" if len(regime_details) >= 1 else "DATA_ISSUE"
-            logger.info(f"[REGIME] {' '.join(regime_details)} -> SAFETY_MODE (EXT=0.8) reason={reason}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"[REGIME] {' '.join(regime_details)} -> SAFETY_MODE (EXT=0.8) reason={reason}")
+            _sentiment_cache = (bucket, 0.8)
             return 0.8
         
 
 
-    async def scan(self, stocks_list, token_map, index_memory=None):
+    async def scan(self, stocks_list, token_map, index_memory=None, max_signals=None):
         """
         Scans a list of stocks.
         stocks_list: list of dicts [{'symbol': 'INFY', 'ltp': 1500}, ...]
         token_map: dict {'INFY': '1234'}
         index_memory: dict for caching index high/low
+        max_signals: stop scanning once this many stocks have passed (None = scan all)
         """
         start_time = datetime.now()
         logger.info(f"Starting Async Scan for {len(stocks_list)} stocks...")
         
-        # Initialize Semaphore inside the loop to ensure Loop Affinity
-        self.sem = asyncio.Semaphore(self.concurrency)
+        # Initialize admission controller/limiters inside the loop to ensure Loop Affinity.
+        # Created once per loop and kept across scans (the bot reuses one scan loop), so pacing
+        # and concurrency limits carry over from one scan to the next.
+        loop = asyncio.get_running_loop()
+        if self.admission is None or self._sync_loop is not loop:
+            self.admission = AdmissionController(self.concurrency)
+            self.limiter = AsyncRateLimiter(calls_per_second=1 / 0.6) # Approx 1.5 symbols/sec
+            self._sync_loop = loop
+        elif self.admission.limit < self.concurrency:
+            # Recover one slot per scan after a rate-limit backoff
+            await self.admission.set_limit(self.admission.limit + 1)
+        # Blocking SDK fetches get their own pool sized for the concurrency limit (15M + 5M per task),
+        # instead of queueing on the loop's small shared default executor
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency * 2,
+            thread_name_prefix="DhanFetch"
+        )
+        # Both candle requests (15M + 5M) cover the same 5-day window; format it once per scan
+        self.date_range = intraday_date_range(5)
         
+        try:
+            return await self._scan(stocks_list, token_map, index_memory, start_time, max_signals)
+        finally:
+            # Drop any still-queued fetches (e.g. after an early exit on max_signals)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _scan(self, stocks_list, token_map, index_memory, start_time, max_signals=None):
         signals = []
+        pending_signals = [] # (LTP future, signal) for stocks that passed all checks
+        loop = asyncio.get_running_loop()
         
-        async with aiohttp.ClientSession(timeout=self.timeout) as session:
-            
-            # Step 1: Check Market Sentiment (Dynamic Limit)
-            extension_limit = await self.check_market_sentiment(session, index_memory)
-            logger.info(f"⚡ SENTINEL DEBUG ACTIVE ⚡ - Market Check Done. Ext Limit: {extension_limit}")
+        session = await self._get_session()
+        
+        # Step 1: Check Market Sentiment (Dynamic Limit)
+        # Runs alongside the throttled fetch fan-out below; only needed once results are processed
+        sentiment_task = asyncio.create_task(self.check_market_sentiment(session, index_memory))
 
-            tasks = []
-            
-            # Rate Limiting: Process in smaller batches
-            # Dhan Rate Limit is aggressive for historical data (DH-904).
-            # Dropping from 3/sec to 1/sec + delay.
-            
-            rate_limit_batch_size = 1
-            rate_limit_delay = 0.6 # Slower but safer (Approx 1.5 req/sec)
-            
-            total_stocks = len(stocks_list)
-            
-            for i, stock in enumerate(stocks_list):
-                symbol = stock['symbol']
-                token = token_map.get(symbol)
-                
-                if token:
-                    # Fire Request
-                    tasks.append(asyncio.create_task(self.bounded_fetch(session, symbol, token)))
-                    
-                    # Throttling Logic
-                    if (i + 1) % rate_limit_batch_size == 0:
-                        await asyncio.sleep(rate_limit_delay)
+        total_stocks = len(stocks_list)
+        
+        # Only stocks with a known token are fetched
+        valid_stocks = [(stock, token) for stock in stocks_list if (token := token_map.get(stock['symbol']))]
+        
+        # Fire Requests (pacing happens in bounded_fetch via self.limiter)
+        tasks = [asyncio.create_task(self.bounded_fetch(session, stock, token, sentiment_task)) for stock, token in valid_stocks]
+        
+        extension_limit = await sentiment_task
+        logger.info(f"⚡ SENTINEL DEBUG ACTIVE ⚡ - Market Check Done. Ext Limit: {extension_limit}")
+        
+        # Process as they complete (Tasks are already running from loop above)
+        # Finished tasks land on a queue via done-callbacks: one wakeup per result, and the
+        # indicator/check work below overlaps with fetches still in flight.
+        done_queue = asyncio.Queue()
+        for task in tasks:
+            task.add_done_callback(done_queue.put_nowait)
+        
+        completed_count = 0
+        rejection_stats = {"Bias": 0, "Price": 0, "Wait": 0, "Data": 0}
+        
+        for _ in range(len(tasks)):
+            task = await done_queue.get()
+            completed_count += 1
+            if completed_count % 50 == 0:
+                logger.info(f"⏳ Processed {completed_count}/{total_stocks} stocks...")
             
-            # Process as they complete (Tasks are already running from loop above)
-            completed_count = 0
-            rejection_stats = {"Bias": 0, "Price": 0, "Wait": 0, "Data": 0}
+            stock_info, current_token, raw_data = task.result()
+            symbol = stock_info['symbol']
             
-            for task in asyncio.as_completed(tasks):
-                completed_count += 1
-                if completed_count % 50 == 0:
-                    logger.info(f"⏳ Processed {completed_count}/{total_stocks} stocks...")
-                
-                symbol, raw_data = await task
-                
-                # Check for None (Failed Fetch)
-                if raw_data is None:
-                    rejection_stats["Data"] += 1
-                    continue
+            # Check for None (Failed Fetch)
+            if raw_data is None:
+                rejection_stats["Data"] += 1
+                continue
 
-                if raw_data is not None:
-                    try:
-                        # raw_data is now a tuple: (df_15m, df_5m)
-                        if isinstance(raw_data, tuple) and len(raw_data) == 2:
-                            df_15m, df_5m = raw_data
-                            # logger.info(f"[DEBUG_DATA] {symbol}: ✅ Fetched 15M ({len(df_15m)}) + 5M ({len(df_5m)}) candles")
-                            
-                            # Import check_15m_bias AND check_chop_filter
-                            from indicators import check_15m_bias, check_chop_filter
-                            
-                            # Step 1: Check 15M Bias (The Golden Rule)
-                            df_15m = calculate_indicators(df_15m)
-                            bias_15m, bias_reason = check_15m_bias(df_15m)
-                            
-                            # REJECT if 15M is not BULLISH
-                            if bias_15m != 'BULLISH':
-                                # logger.info(f"❌ {symbol} REJECTED: {bias_reason}") # Removed to reduce spam
-                                rejection_stats["Bias"] += 1
-                                continue
-                            
-                            # Step 1.5: Check Chop Filter (Avoid Sideways Action)
-                            df_5m = calculate_indicators(df_5m) # Calc indicators for 5m early
-                            is_clean, chop_reason = check_chop_filter(df_5m)
+            if raw_data is not None:
+                try:
+                    # raw_data is now a tuple: (df_15m, df_5m, bias_reason, evaluation)
+                    if isinstance(raw_data, tuple) and len(raw_data) == 4:
+                        df_15m, df_5m, bias_reason, evaluation = raw_data
+                        
+                        # Step 1: 15M Bias was checked in the fetch task.
+                        # REJECT if 15M is not BULLISH (5M was never fetched)
+                        if df_5m is None:
+                            # logger.info(f"❌ {symbol} REJECTED: {bias_reason}") # Removed to reduce spam
+                            rejection_stats["Bias"] += 1
+                            continue
+                        
+                        # Step 1.5 + 2: Chop Filter and 5M Entry Signal (evaluated in the fetch task)
+                        stage, message, close_p, ema_20 = evaluation
+                        
+                        if stage == 'ERROR':
+                            # Evaluation failed in the fetch task (already caught there)
+                            logger.error(f"Processing Error {symbol}: {message}")
+                            rejection_stats["Wait"] += 1 # Count processing errors as 'Other/Wait'
+                            continue
+                        
+                        if stage == 'CHOP':
+                            # logger.info(f"❌ {symbol} REJECTED: {message}") 
+                            rejection_stats["Bias"] += 1 # Count as Bias/Filter rejection
+                            continue
+                        
+                        buy_signal = stage == 'BUY'
+                        if buy_signal:
+                            logger.info(f"✅ {symbol} PASSED: {bias_reason} | 5M: {message}")
                             
-                            if not is_clean:
-                                # logger.info(f"❌ {symbol} REJECTED: {chop_reason}") 
-                                rejection_stats["Bias"] += 1 # Count as Bias/Filter rejection
-                                continue
+                            # Retrieve sector
+                            sector_name = stock_info.get('sector', 'Unknown')
                             
+                            # FIX: Fetch LIVE price from Dhan instead of using stale scraper price
+                            # Fired on the fetch pool and collected after the loop, so the consumer
+                            # keeps processing results while the quote call is in flight.
+                            # Token is the CURRENT symbol's (carried back from its fetch task;
+                            # only stocks with a token are dispatched).
+                            ltp_future = loop.run_in_executor(self.executor, fetch_ltp, self.smartApi, current_token, symbol)
                             
-                            # Step 2: Check 5M Entry Signal
-                            # df_5m already calculated above
-                            screener_ltp = 0.0
-                            buy_signal, message = check_buy_condition(df_5m, current_price=screener_ltp, extension_limit=extension_limit)
+                            # Add signal once its LTP arrives (MUST be inside if buy_signal block)
+                            pending_signals.append((ltp_future, {
+                                'symbol': symbol,
+                                'price': 0.0,  # Filled with LIVE price from Dhan below
+                                'message': message,
+                                'sector': sector_name,
+                                'time': get_ist_now().strftime("%Y-%m-%d %H:%M:%S")
+                            }))
                             
-                            if buy_signal:
-                                logger.info(f"✅ {symbol} PASSED: {bias_reason} | 5M: {message}")
-                                
-                                # Retrieve sector
-                                stock_info = next((s for s in stocks_list if s['symbol'] == symbol), None)
-                                sector_name = stock_info.get('sector', 'Unknown') if stock_info else "Unknown"
-                                
-                                # FIX: Fetch LIVE price from Angel One instead of using stale scraper price
-                                live_ltp = 0.0
-                                try:
-                                    from dhan_api_helper import fetch_ltp
-                                    # Fix: Re-fetch token for the CURRENT symbol!
-                                    current_token = token_map.get(symbol)
-                                    if current_token:
-                                        live_ltp = fetch_ltp(self.smartApi, current_token, symbol)
-                                    else:
-                                        logger.warning(f"⚠️ {symbol}: Token not found for LTP fetch")
-                                    if live_ltp is None or live_ltp == 0:
-                                        logger.error(f"❌ {symbol}: LTP_UNAVAILABLE (Dhan Fetch Failed). Skipping.")
-                                        continue # MANDATORY SAFETY RULE
-
-                                except Exception as e:
-                                    logger.error(f"❌ {symbol}: LTP fetch error: {e}. Skipping.")
-                                    continue # MANDATORY SAFETY RULE
-
-                                # Add signal (MUST be inside if buy_signal block)
-                                signals.append({
-                                    'symbol': symbol,
-                                    'price': live_ltp,  # Now using LIVE price from Dhan
-                                    'message': message,
-                                    'sector': sector_name,
-                                    'time': get_ist_now().strftime("%Y-%m-%d %H:%M:%S")
-                                })
-                            else:
-                                rejection_stats["Price"] += 1
-                                # Log "Interesting" rejections (Close > EMA20) to filter noise
-                                last_row = df_5m.iloc[-1]
-                                close_p = last_row['close']
-                                ema_20 = last_row.get('EMA_20', 0)
+                            # Enough signals: drop the rest of the scan (fetches + indicator work)
+                            if max_signals and len(pending_signals) >= max_signals:
+                                logger.info(f"🛑 Max signals ({max_signals}) reached. Skipping remaining stocks.")
+                                for t in tasks:
+                                    t.cancel()
+                                break
+                        else:
+                            rejection_stats["Price"] += 1
+                            # Log "Interesting" rejections (Close > EMA20) to filter noise
+                            # (skipped entirely when INFO is silenced)
+                            if logger.isEnabledFor(logging.INFO):
                                 if close_p > ema_20:
                                     ext_pct = ((close_p - ema_20) / ema_20) * 100 if ema_20 > 0 else 0
                                     logger.info(f"[DEBUG_REJECT] {symbol}: Msg='{message}' | Ext={ext_pct:.2f}%")
 
-                    except Exception as e:
-                        logger.error(f"Processing Error {symbol}: {e}")
-                        rejection_stats["Wait"] += 1 # Count processing errors as 'Other/Wait'
-                        continue
+                except Exception as e:
+                    # Unexpected: keep scanning the other symbols, but log the traceback
+                    logger.exception(f"Processing Error {symbol}: {e}")
+                    rejection_stats["Wait"] += 1 # Count processing errors as 'Other/Wait'
+                    continue
         
+        # Collect live LTPs for passed signals
+        for ltp_future, signal in pending_signals:
+            symbol = signal['symbol']
+            try:
+                live_ltp = await ltp_future
+            except Exception as e:
+                logger.error(f"❌ {symbol}: LTP fetch error: {e}. Skipping.")
+                continue # MANDATORY SAFETY RULE
+            
+            if live_ltp is None or live_ltp == 0:
+                logger.error(f"❌ {symbol}: LTP_UNAVAILABLE (Dhan Fetch Failed). Skipping.")
+                continue # MANDATORY SAFETY RULE
+            
+            signal['price'] = live_ltp  # Now using LIVE price from Dhan
+            signals.append(signal)
+    
         duration = (datetime.now() - start_time).total_seconds()
         logger.info(f"Async Scan Completed in {duration:.2f}s. Found {len(signals)} signals.")
         logger.info(f"📊 Scan Stats: {rejection_stats}")
@@ -14,9 +14,11 @@ Usage:
 """
 
 import argparse
+import orjson
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
 
@@ -34,21 +36,69 @@ from indicators import (
 from main import calculate_structure_based_sl, calculate_structure_based_tp
 from dhanhq import dhanhq
 
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        return lambda f: f
+
 
 # ─── Constants ────────────────────────────────────────────────────────────────
 ENTRY_END_TIME   = "14:30"   # No new entries after this time
 SQUARE_OFF_TIME  = "15:15"   # Force-close all open positions
 EXTENSION_LIMIT  = 1.5       # Max % from EMA20 (same as live bot)
 MIN_RR           = 1.5       # Minimum risk:reward to accept a trade
+MAX_TRADES_PER_DAY = 2       # Entries per day for the symbol (same as live bot's max_trades_per_stock)
+DYN_SR_PRD       = 10        # Pivot period for get_dynamic_sr_levels (its default)
+
+# Same cutoffs as minutes since midnight (bars are compared as ints, not "HH:MM" strings)
+ENTRY_END_MIN    = int(ENTRY_END_TIME[:2]) * 60 + int(ENTRY_END_TIME[3:])
+SQUARE_OFF_MIN   = int(SQUARE_OFF_TIME[:2]) * 60 + int(SQUARE_OFF_TIME[3:])
 
 
 # ─── Data Fetching ────────────────────────────────────────────────────────────
 
+FETCH_WINDOW_DAYS = 90  # Dhan intraday history allows at most ~90 days per request
+
+
 def fetch_historical_candles(dhan, token: str, from_date: str, to_date: str, interval_min: int = 5) -> pd.DataFrame | None:
     """
     Fetch historical intraday candles from Dhan API using the native interval param.
     Supports interval_min: 1, 5, 15, 25, 60
+    Ranges longer than FETCH_WINDOW_DAYS are fetched window by window and concatenated.
     """
+    start = datetime.strptime(from_date, "%Y-%m-%d")
+    end = datetime.strptime(to_date, "%Y-%m-%d")
+    frames = []
+    while True:
+        window_end = min(start + timedelta(days=FETCH_WINDOW_DAYS), end)
+        df = _fetch_candle_window(dhan, token, start.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d"), interval_min)
+        if df is not None:
+            frames.append(df)
+        if window_end >= end:
+            break
+        # Windows share their boundary day (duplicates are dropped below)
+        start = window_end
+
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    # Dhan API returns timestamps in UTC. Convert to IST (UTC+5:30) once for the whole range.
+    df['datetime'] = df['datetime'] + pd.Timedelta(hours=5, minutes=30)
+    # Dhan normally returns candles in order, so the sort is usually skipped
+    if not df['datetime'].is_monotonic_increasing:
+        df = df.sort_values('datetime', ignore_index=True)
+    if len(frames) > 1:
+        df = df.drop_duplicates(subset='datetime', ignore_index=True)
+    return df
+
+
+def _fetch_candle_window(dhan, token: str, from_date: str, to_date: str, interval_min: int) -> pd.DataFrame | None:
+    """One intraday_minute_data request -> unsorted frame with naive UTC datetimes."""
     try:
         data_limiter.wait()
         raw = dhan.intraday_minute_data(
@@ -70,19 +120,17 @@ def fetch_historical_candles(dhan, token: str, from_date: str, to_date: str, int
             print(f"  ⚠️  Cannot find time key. Keys: {list(r.keys())}")
             return None
 
+        # Columns are built from pre-typed arrays in one pass (same float32/int32 layout as
+        # dhan_api_helper.candles_to_frame), so no per-column recast copies afterwards.
         df = pd.DataFrame({
             'datetime': pd.to_datetime(r[time_key], unit='s' if isinstance(r[time_key][0], (int, float)) else None),
-            'open':   r['open'],
-            'high':   r['high'],
-            'low':    r['low'],
-            'close':  r['close'],
-            'volume': r['volume'],
+            'open':   np.asarray(r['open'], dtype=np.float32),
+            'high':   np.asarray(r['high'], dtype=np.float32),
+            'low':    np.asarray(r['low'], dtype=np.float32),
+            'close':  np.asarray(r['close'], dtype=np.float32),
+            'volume': np.asarray(r['volume'], dtype=np.int32),
         })
 
-        # Dhan API returns timestamps in UTC. Convert to IST (UTC+5:30).
-        df['datetime'] = df['datetime'] + pd.Timedelta(hours=5, minutes=30)
-
-        df = df.sort_values('datetime').reset_index(drop=True)
         return df
 
     except Exception as e:
@@ -93,6 +141,74 @@ def fetch_historical_candles(dhan, token: str, from_date: str, to_date: str, int
 
 # ─── Simulation Engine ────────────────────────────────────────────────────────
 
+# Exit reason codes returned by _simulate_exits
+EXIT_SL, EXIT_TP, EXIT_TIME, EXIT_NONE = 0, 1, 2, 3
+EXIT_REASONS = ('STOP_LOSS', 'TARGET_HIT', 'TIME_EXIT')
+
+
+@njit(cache=True)
+def _simulate_exits(high, low, close, bar_min, start, end, entry_price, original_sl, sl, tp,
+                    highest, level, square_off_min):
+    """
+    Walk an open position over bars [start, end): hard SL, TP, square-off, then the
+    3-level continuous TSL ratchet (same order as the live bot).
+    Returns (exit_idx, exit_price, exit_reason_code, sl, highest, tsl_level);
+    exit_idx == end and code EXIT_NONE if the position is still open after the range.
+    """
+    risk_per_share = entry_price - original_sl
+    for j in range(start, end):
+        if high[j] > highest:
+            highest = high[j]
+
+        # 1. Hard Stop Loss
+        if low[j] <= sl:
+            return j, sl, EXIT_SL, sl, highest, level
+        # 2. Take Profit
+        if tp > 0 and high[j] >= tp:
+            return j, tp, EXIT_TP, sl, highest, level
+        # 4. Square-Off Time
+        if bar_min[j] >= square_off_min:
+            return j, close[j], EXIT_TIME, sl, highest, level
+
+        # 3. Continuous Trailing Stop Loss (one level step per bar)
+        if risk_per_share > 0:
+            max_rr = (highest - entry_price) / risk_per_share
+            proposed_sl = sl
+            new_level = level
+            if max_rr >= 1.0 and level < 1:
+                proposed_sl = entry_price * 1.001
+                new_level = 1
+            elif max_rr >= 2.0 and level < 2:
+                proposed_sl = entry_price + (1.0 * risk_per_share)
+                new_level = 2
+            elif max_rr >= 3.0 and level < 3:
+                proposed_sl = entry_price + (2.0 * risk_per_share)
+                new_level = 3
+            if proposed_sl > sl:
+                sl = proposed_sl
+                level = new_level
+
+    return end, 0.0, EXIT_NONE, sl, highest, level
+
+
+def _trade_record(position: dict, day) -> dict:
+    """Result row for a closed position (prices rounded to 2 dp for the report / JSON)."""
+    pnl = position['exit_price'] - position['entry_price']
+    return {
+        'date':        str(day),
+        'status':      position['exit_reason'],
+        'entry_price': round(position['entry_price'], 2),
+        'exit_price':  round(position['exit_price'], 2),
+        'entry_time':  position['entry_time'],
+        'exit_time':   position['exit_time'],
+        'sl':          round(position['original_sl'], 2),
+        'tp':          round(position['tp'], 2) if position['tp'] else 0,
+        'tp_reason':   position['tp_reason'],
+        'rr_ratio':    round(position['rr_ratio'], 2),
+        'pnl_pts':     round(pnl, 2),
+    }
+
+
 def simulate_all(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> list:
     """
     Walk-forward bar-by-bar simulation over the entire historical dataset.
@@ -102,17 +218,70 @@ def simulate_all(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> list:
     position = None
     results = []
 
-    # Map 15m data by date for quick access
-    df_15m['date_str'] = pd.to_datetime(df_15m['datetime']).dt.date.astype(str)
+    # Indicators are causal (EMA/VWAP/ATR at a bar only depend on earlier bars), so
+    # computing them once over the full history gives the same values a per-bar
+    # recompute on each growing prefix would. The loop below just takes prefix views.
+    df_5m_ind_full = calculate_indicators(df_5m)
+    df_15m_ind_full = calculate_indicators(df_15m)
+    # 15m candles are in time order: "all 15m rows up to the bar's date" is a prefix,
+    # whose end is found with a binary search on the day numbers once per trading day
+    dates_15m = pd.to_datetime(df_15m['datetime']).to_numpy().astype('datetime64[D]')
+    end_15m = 0
+    
+    # Per-bar fields as plain column arrays (indexing df_5m.iloc[i] builds a Series per bar);
+    # date / "HH:MM" strings are formatted once for the whole column (the strings only
+    # go into trade records; time cutoffs compare minutes since midnight)
+    close_arr = df_5m['close'].to_numpy()
+    high_arr  = df_5m['high'].to_numpy()
+    low_arr   = df_5m['low'].to_numpy()
+    date_arr  = df_5m['datetime'].dt.date.to_numpy()
+    time_str_arr = df_5m['datetime'].dt.strftime("%H:%M").to_numpy()
+    bar_min_arr  = (df_5m['datetime'].dt.hour.to_numpy() * 60 + df_5m['datetime'].dt.minute.to_numpy()).astype(np.int64)
+    # float64 copies for the exit kernel (one compiled signature whatever the candle dtype)
+    exit_arrs = (high_arr.astype(np.float64), low_arr.astype(np.float64), close_arr.astype(np.float64), bar_min_arr)
+    # For each bar, index of the first bar of the next day (exit scans stop there)
+    day_starts = np.flatnonzero(date_arr[1:] != date_arr[:-1]) + 1
+    day_end_arr = np.append(day_starts, len(df_5m))[np.searchsorted(day_starts, np.arange(len(df_5m)), side='right')]
+    next_event = 0   # Bar at which the open position exits (or the next day's first bar)
+
+    # S/R caches. calculate_sr_levels only sees the 15m prefix, which is fixed for the day.
+    # The pivots of a 5m prefix are the full-history pivots confirmed DYN_SR_PRD bars before
+    # its end (centered window), so get_dynamic_sr_levels only changes when a new pivot is
+    # confirmed or the 300-bar channel extremes move.
+    roll_w = 2 * DYN_SR_PRD + 1
+    pivot_count = np.cumsum(
+        (high_arr == df_5m['high'].rolling(window=roll_w, center=True).max().to_numpy()).astype(np.int64)
+        + (low_arr == df_5m['low'].rolling(window=roll_w, center=True).min().to_numpy())
+    )
+    bias_day = None
+    bias = None
+    sr_levels_day = None
+    sr_levels = None
+    dyn_key = None
+    dyn_levels = None
+
+    def advance_position(start, end):
+        """Run the exit kernel over [start, end) and fold its state back into `position`."""
+        exit_idx, exit_price, code, sl, highest, level = _simulate_exits(
+            *exit_arrs, start, end,
+            float(position['entry_price']), float(position['original_sl']), float(position['sl']),
+            float(position['tp'] or 0.0), float(position['highest_ltp']), int(position['tsl_level']),
+            SQUARE_OFF_MIN,
+        )
+        position['sl'], position['highest_ltp'], position['tsl_level'] = float(sl), float(highest), int(level)
+        if code != EXIT_NONE:
+            position['exit_price']  = float(exit_price)
+            position['exit_reason'] = EXIT_REASONS[code]
+            position['exit_time']   = time_str_arr[exit_idx]
+        return exit_idx
     
     current_day = None
     daily_no_signal = True
+    trades_today = 0
 
     for i in range(WARMUP + 1, len(df_5m)):
-        bar      = df_5m.iloc[i]
-        bar_time = bar['datetime']
-        bar_date = bar_time.date()
-        bar_time_str = bar_time.strftime("%H:%M") if hasattr(bar_time, 'strftime') else str(bar_time)
+        bar_date = date_arr[i]
+        bar_time_str = time_str_arr[i]
 
         if current_day != bar_date:
             # End of previous day - record NO SIGNAL if nothing happened
@@ -120,101 +289,46 @@ def simulate_all(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> list:
                 results.append({'date': str(current_day), 'status': 'NO_SIGNAL'})
             current_day = bar_date
             daily_no_signal = True
+            trades_today = 0
+            end_15m = int(np.searchsorted(dates_15m, np.datetime64(bar_date, 'D'), side='right'))
 
         # ── If position is open: manage it ──────────────────────────────────
         if position:
-            current_price = bar['close']
-            high_of_bar   = bar['high']
-            low_of_bar    = bar['low']
-
-            if high_of_bar > position['highest_ltp']:
-                position['highest_ltp'] = high_of_bar
-
-            # 1. Hard Stop Loss
-            if low_of_bar <= position['sl']:
-                position['exit_price']  = position['sl']
-                position['exit_reason'] = 'STOP_LOSS'
-                position['exit_time']   = bar_time_str
-            # 2. Take Profit
-            elif position['tp'] and high_of_bar >= position['tp']:
-                position['exit_price']  = position['tp']
-                position['exit_reason'] = 'TARGET_HIT'
-                position['exit_time']   = bar_time_str
-            # 4. Square-Off Time
-            elif bar_time_str >= SQUARE_OFF_TIME:
-                position['exit_price']  = current_price
-                position['exit_reason'] = 'TIME_EXIT'
-                position['exit_time']   = bar_time_str
-            
-            # If an exit occurred this bar, finalize position
-            if 'exit_price' in position:
-                pnl = position['exit_price'] - position['entry_price']
-                results.append({
-                    'date':        str(bar_date),
-                    'status':      position['exit_reason'],
-                    'entry_price': round(position['entry_price'], 2),
-                    'exit_price':  round(position['exit_price'], 2),
-                    'entry_time':  position['entry_time'],
-                    'exit_time':   position['exit_time'],
-                    'sl':          round(position['original_sl'], 2),
-                    'tp':          round(position['tp'], 2) if position['tp'] else 0,
-                    'tp_reason':   position['tp_reason'],
-                    'rr_ratio':    round(position['rr_ratio'], 2),
-                    'pnl_pts':     round(pnl, 2),
-                })
-                position = None
+            # Bars up to the exit (or the end of the day) were already walked by the kernel
+            if i < next_event:
                 continue
-
-            # 3. Continuous Trailing Stop Loss
-            risk_per_share = position['entry_price'] - position['original_sl']
-            if risk_per_share > 0:
-                max_profit = position['highest_ltp'] - position['entry_price']
-                max_rr     = max_profit / risk_per_share
-                current_level = position.get('tsl_level', 0)
-                proposed_sl   = position['sl']
-                new_level     = current_level
-
-                if max_rr >= 1.0 and current_level < 1:
-                    proposed_sl = position['entry_price'] * 1.001
-                    new_level   = 1
-                elif max_rr >= 2.0 and current_level < 2:
-                    proposed_sl = position['entry_price'] + (1.0 * risk_per_share)
-                    new_level   = 2
-                elif max_rr >= 3.0 and current_level < 3:
-                    proposed_sl = position['entry_price'] + (2.0 * risk_per_share)
-                    new_level   = 3
-
-                if proposed_sl > position['sl']:
-                    position['sl']        = proposed_sl
-                    position['tsl_level'] = new_level
-
-            continue  # No exit this bar — keep holding
+            if 'exit_price' not in position:
+                # Still open after the previous day's last bar: walk today's bars
+                next_event = advance_position(i, day_end_arr[i])
+                if i < next_event:
+                    continue
+
+            # Exit bar reached: finalize position
+            results.append(_trade_record(position, bar_date))
+            position = None
+            continue
 
         # ── No position: look for entry signal ──────────────────────────────
-        if bar_time_str >= ENTRY_END_TIME:
+        # Skip all entry-side work once the day's entry window / trade cap is used up
+        if bar_min_arr[i] >= ENTRY_END_MIN or trades_today >= MAX_TRADES_PER_DAY:
+            continue
+
+        # HTF bias first: it gates everything else, and its 15m input (history up to the
+        # current date) is fixed for the whole day, so it is evaluated once per day
+        if bias_day != bar_date:
+            # Same "too short for indicators" cut-off as calculate_indicators on the slice
+            df_15m_ind = df_15m_ind_full.iloc[:end_15m] if df_15m_ind_full is not None and end_15m >= 20 else None
+            bias, bias_msg = check_15m_bias(df_15m_ind)
+            bias_day = bar_date
+        if bias != 'BULLISH':
             continue
 
         # Use continuous history up to this bar (simulate live bot 5-day fetch)
-        df_slice_5m = df_5m.iloc[:i].copy()
+        # (prefix view of the precomputed indicators, no copy / recompute)
+        df_ind = df_5m_ind_full.iloc[:i]
         
         # 15M history up to current date
-        df_slice_15m = df_15m[df_15m['date_str'] <= str(bar_date)].copy()
-
-
-        if len(df_slice_5m) < WARMUP + 1:
-            continue
-
-        # Calculate indicators
-        df_ind = calculate_indicators(df_slice_5m)
-        if df_ind is None or len(df_ind) < 2:
-            continue
-
-        df_15m_ind = calculate_indicators(df_slice_15m)
-
-        # HTF bias
-        bias, bias_msg = check_15m_bias(df_15m_ind)
-        if bias != 'BULLISH':
-            continue
+        df_slice_15m = df_15m.iloc[:end_15m]
 
         # 5M Buy signal
         signal, signal_msg = check_buy_condition(df_ind, extension_limit=EXTENSION_LIMIT)
@@ -229,7 +343,9 @@ def simulate_all(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> list:
 
         # S/R Resistance Check (Rejection if < 0.25% away)
         static_res = []
-        sr_levels = calculate_sr_levels(df_slice_15m)
+        if sr_levels_day != bar_date:
+            sr_levels = calculate_sr_levels(df_slice_15m)
+            sr_levels_day = bar_date
         pdh = None
         cdh_val = None
         if sr_levels:
@@ -239,7 +355,10 @@ def simulate_all(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> list:
             if cdh_val and cdh_val > entry_price: static_res.append(cdh_val)
 
         dynamic_res = []
-        dyn_levels = get_dynamic_sr_levels(df_ind)
+        key = (pivot_count[i - 1 - DYN_SR_PRD], high_arr[max(0, i - 300):i].max(), low_arr[max(0, i - 300):i].min())
+        if key != dyn_key:
+            dyn_levels = get_dynamic_sr_levels(df_ind, prd=DYN_SR_PRD)
+            dyn_key = key
         if dyn_levels:
             for lvl in dyn_levels:
                 if lvl['lo'] > entry_price:
@@ -282,6 +401,8 @@ def simulate_all(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> list:
             continue  # Trade rejected due to low R:R or no target
 
         # ── Open Position ────────────────────────────────────────────────────
+        trades_today += 1
+        daily_no_signal = False
         position = {
             'entry_price': entry_price,
             'entry_time':  bar_time_str,
@@ -294,29 +415,17 @@ def simulate_all(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> list:
             'tsl_level':   0,
             'sl_reason':   sl_reason,
         }
+        next_event = advance_position(i + 1, day_end_arr[i])
 
     # Market closed with no exit
     # Market data ended
     if position and 'exit_price' not in position:
-        position['exit_price']  = df_5m.iloc[-1]['close']
+        position['exit_price']  = close_arr[-1]
         position['exit_reason'] = 'NO_EXIT_DATA'
         position['exit_time']   = 'EOD'
 
     if position:
-        pnl = position['exit_price'] - position['entry_price']
-        results.append({
-            'date':        str(current_day),
-            'status':      position['exit_reason'],
-            'entry_price': round(position['entry_price'], 2),
-            'exit_price':  round(position['exit_price'], 2),
-            'entry_time':  position['entry_time'],
-            'exit_time':   position['exit_time'],
-            'sl':          round(position['original_sl'], 2),
-            'tp':          round(position['tp'], 2) if position['tp'] else 0,
-            'tp_reason':   position['tp_reason'],
-            'rr_ratio':    round(position['rr_ratio'], 2),
-            'pnl_pts':     round(pnl, 2),
-        })
+        results.append(_trade_record(position, current_day))
     elif daily_no_signal and current_day is not None:
         results.append({'date': str(current_day), 'status': 'NO_SIGNAL'})
 
@@ -381,14 +490,18 @@ def main():
     print("\n[+] Connecting to Dhan API...")
     dhan = get_dhan_session()
 
-    print(f"[+] Fetching 5-min candles for {args.symbol} ({args.token}) from {args.from_date} to {args.to_date}...")
-    df_5m = fetch_historical_candles(dhan, args.token, args.from_date, args.to_date, interval_min=5)
+    # Both fetches run concurrently (data_limiter still spaces the requests)
+    print(f"[+] Fetching 5-min + 15-min candles for {args.symbol} ({args.token}) from {args.from_date} to {args.to_date}...")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        future_5m = pool.submit(fetch_historical_candles, dhan, args.token, args.from_date, args.to_date, 5)
+        future_15m = pool.submit(fetch_historical_candles, dhan, args.token, args.from_date, args.to_date, 15)
+        df_5m = future_5m.result()
+        df_15m = future_15m.result()
+
     if df_5m is None or df_5m.empty:
         print("[ERR] No 5-min data returned. Exiting.")
         return
 
-    print("[+] Fetching 15-min candles...")
-    df_15m = fetch_historical_candles(dhan, args.token, args.from_date, args.to_date, interval_min=15)
     if df_15m is None or df_15m.empty:
         print("[WARN] No 15-min data. HTF bias will be NEUTRAL for all days.")
         df_15m = pd.DataFrame()
@@ -408,10 +521,9 @@ def main():
     print_report(args.symbol, results)
 
     # Also save to JSON for easy review
-    import json
     out_file = f"backtest_{args.symbol}_{args.from_date}_to_{args.to_date}.json"
-    with open(out_file, 'w') as f:
-        json.dump(results, f, indent=2, default=str)
+    with open(out_file, 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY, default=str))
     print(f"[+] Full results saved to: {out_file}")
 
 
@@ -3,7 +3,7 @@ import os
 sys.path.append(os.getcwd())
 
 from smart_api_helper import SmartApiHelper
-from config import ConfigManager
+from config import config_manager
 import logging
 
 # Setup basic logging
@@ -11,8 +11,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 async def verify_tiindia():
-    config = ConfigManager()
-    api = SmartApiHelper(config.config)
+    api = SmartApiHelper(config_manager.config)
     
     logger.info("Fetching Instrument List...")
     # This might take a few seconds
@@ -1,6 +1,7 @@
 import json
 import os
 import logging
+import threading
 from dotenv import load_dotenv
 from database import get_remote_config, save_remote_config
 
@@ -41,34 +42,49 @@ DEFAULT_CONFIG = {
 }
 
 class ConfigManager:
+    _instance = None
+
+    def __new__(cls):
+        # Single shared instance: ConfigManager() anywhere returns the module's config_manager
+        # instead of re-fetching the config from Supabase
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._loaded = False
+        return cls._instance
+
     def __init__(self):
+        if self._loaded:
+            return
         self.config = DEFAULT_CONFIG.copy()
+        self.lock = threading.Lock() # Held by every writer of self.config
         self.load_config()
+        self._loaded = True
 
     def load_config(self):
-        # 1. Try Supabase First
-        remote_config = get_remote_config()
-        if remote_config:
-            self.config = self.update_nested(self.config, remote_config)
-            logging.info("✅ Config Loaded from Supabase")
+        with self.lock:
+            # 1. Try Supabase First
+            remote_config = get_remote_config()
+            if remote_config:
+                self.config = self.update_nested(self.config, remote_config)
+                logging.info("✅ Config Loaded from Supabase")
+                self._apply_env_overrides()
+                # Sync local file
+                self.save_local() 
+                return
+
+            # 2. Fallback to Local File
+            if os.path.exists(CONFIG_FILE):
+                try:
+                    with open(CONFIG_FILE, "r") as f:
+                        saved_config = json.load(f)
+                        self.config = self.update_nested(self.config, saved_config)
+                        logging.info("✅ Config Loaded from Local File")
+                except Exception as e:
+                    logging.error(f"Error loading local config: {e}")
+            else:
+                self.save_config()
+                
             self._apply_env_overrides()
-            # Sync local file
-            self.save_local() 
-            return
-
-        # 2. Fallback to Local File
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, "r") as f:
-                    saved_config = json.load(f)
-                    self.config = self.update_nested(self.config, saved_config)
-                    logging.info("✅ Config Loaded from Local File")
-            except Exception as e:
-                logging.error(f"Error loading local config: {e}")
-        else:
-            self.save_config()
-            
-        self._apply_env_overrides()
 
     def _apply_env_overrides(self):
         """Override sensitive credentials from environment variables"""
@@ -86,12 +102,17 @@ class ConfigManager:
             self.config["credentials"]["smart_api_api_key"] = smart_api_api_key
 
     def update_nested(self, d, u):
-        """Recursively update dictionary d with values from u."""
-        for k, v in u.items():
-            if isinstance(v, dict):
-                d[k] = self.update_nested(d.get(k, {}), v)
-            else:
-                d[k] = v
+        """Deep-update dictionary d with values from u (iterative, no recursion)."""
+        stack = [(d, u)]
+        while stack:
+            dd, uu = stack.pop()
+            for k, v in uu.items():
+                if isinstance(v, dict):
+                    if not isinstance(dd.get(k), dict):
+                        dd[k] = {}
+                    stack.append((dd[k], v))
+                else:
+                    dd[k] = v
         return d
 
     def save_config(self):
@@ -118,24 +139,34 @@ class ConfigManager:
 
     def set(self, keys, value):
         """Set a value by traversing keys. keys is a list/tuple."""
-        d = self.config
-        for k in keys[:-1]:
-            d = d.setdefault(k, {})
-        d[keys[-1]] = value
-        d[keys[-1]] = value
-        self.save_config()
+        with self.lock:
+            d = self.config
+            for k in keys[:-1]:
+                d = d.setdefault(k, {})
+            d[keys[-1]] = value
+            self.save_config()
 
     def get_all(self):
         """Returns the full configuration dictionary."""
         return self.config
 
-    def update(self, section, value):
-        """Updates a configuration section and saves."""
+    def _merge_section(self, section, value):
+        """Merges a dict into an existing dict section, otherwise replaces the section (caller holds self.lock)."""
         if section in self.config and isinstance(self.config[section], dict) and isinstance(value, dict):
             self.config[section].update(value)
         else:
             self.config[section] = value
-        self.save_config()
+
+    def update(self, section, value):
+        """Updates a configuration section and saves."""
+        self.update_bulk({section: value})
+
+    def update_bulk(self, mapping):
+        """Updates several configuration sections at once and saves a single time."""
+        with self.lock:
+            for section, value in mapping.items():
+                self._merge_section(section, value)
+            self.save_config()
 
 # Global Instance
 config_manager = ConfigManager()
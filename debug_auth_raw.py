@@ -98,9 +98,8 @@ async def test_good_auth():
         logger.error(f"Connection Failed: {e}")
 
 async def main():
-    await test_no_auth()
-    await test_bad_auth()
-    await test_good_auth()
+    # Independent connections: run them side by side (log lines from the three interleave)
+    await asyncio.gather(test_no_auth(), test_bad_auth(), test_good_auth(), return_exceptions=True)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -5,6 +5,7 @@ import os
 import asyncio
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Setup Logger
 logging.basicConfig(level=logging.INFO)
@@ -35,27 +36,34 @@ def test_fetch():
     # 3. Test Stocks
     targets = ["SBIN", "M&M", "CROMPTON", "RELIANCE"]
     
-    for sym in targets:
-        token = token_map.get(sym)
-        if not token:
-            logger.error(f"❌ Token NOT FOUND for {sym}")
-            continue
-            
+    def fetch_one(sym, token):
         logger.info(f"Fetching Data for {sym} (Token: {token})...")
-        
-        # 4. Fetch (Synchronous/Blocking call to helper function)
-        try:
-            # Note: smartApi object is passed as first argument
-            df = fetch_candle_data(smartApi, token, sym, interval="FIVE_MINUTE", days=4)
-            
-            if df is not None and not df.empty:
-                logger.info(f"✅ SUCCESS {sym}: Fetched {len(df)} candles.")
-                logger.info(f"Last Candle: {df.iloc[-1].to_dict()}")
-            else:
-                logger.error(f"❌ FAILURE {sym}: Returned None/Empty.")
-                
-        except Exception as e:
-            logger.error(f"❌ EXCEPTION {sym}: {e}")
+        # Note: smartApi object is passed as first argument
+        return fetch_candle_data(smartApi, token, sym, interval="FIVE_MINUTE", days=4)
+
+    # 4. Fetch (blocking helper calls, issued concurrently)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for sym in targets:
+            token = token_map.get(sym)
+            if not token:
+                logger.error(f"❌ Token NOT FOUND for {sym}")
+                continue
+            futures[pool.submit(fetch_one, sym, token)] = sym
+
+        for future in as_completed(futures):
+            sym = futures[future]
+            try:
+                df = future.result()
+
+                if df is not None and not df.empty:
+                    logger.info(f"✅ SUCCESS {sym}: Fetched {len(df)} candles.")
+                    logger.info(f"Last Candle: {df.iloc[-1].to_dict()}")
+                else:
+                    logger.error(f"❌ FAILURE {sym}: Returned None/Empty.")
+
+            except Exception as e:
+                logger.error(f"❌ EXCEPTION {sym}: {e}")
 
 if __name__ == "__main__":
     test_fetch()
@@ -7,8 +7,12 @@ HEADERS = {
     "Referer": "https://intradayscreener.com/sector-performance",
 }
 
+# Keep-alive session (reused if this probe is looped / imported by a polling job)
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+
 try:
-    response = requests.get(SECTOR_API_URL, headers=HEADERS)
+    response = _SESSION.get(SECTOR_API_URL, timeout=30)
     data = response.json()
     
     print("Keys:", data.keys())
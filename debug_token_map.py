@@ -1,10 +1,13 @@
 import requests
-import json
+import orjson
 
 # Download instrument map
 url = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
 print("Downloading instrument map...")
-instruments = requests.get(url, timeout=30).json()
+# Keep-alive session; the scrip master is served gzip-compressed (requests decodes it)
+_SESSION = requests.Session()
+_SESSION.headers.update({"Accept-Encoding": "gzip, deflate"})
+instruments = orjson.loads(_SESSION.get(url, timeout=30).content)
 
 # Filter for the problematic symbols
 target_symbols = ['ASTERDM', 'NH', 'LALPATHLAB', 'TARSONS']
@@ -12,9 +15,16 @@ target_symbols = ['ASTERDM', 'NH', 'LALPATHLAB', 'TARSONS']
 print(f"\nSearching for: {target_symbols}\n")
 print("="*80)
 
+# One pass over the (large) instrument list, bucketing matches per target
+matches_by_symbol = {symbol: [] for symbol in target_symbols}
+for inst in instruments:
+    bucket = matches_by_symbol.get(inst.get('symbol', '').replace('-EQ', ''))
+    if bucket is not None:
+        bucket.append(inst)
+
 for symbol in target_symbols:
-    # Find all matches (NSE + Non-NSE)
-    matches = [i for i in instruments if i.get('symbol', '').replace('-EQ', '') == symbol]
+    # All matches (NSE + Non-NSE)
+    matches = matches_by_symbol[symbol]
     
     print(f"\n[Symbol: {symbol}]")
     print(f"   Total Matches: {len(matches)}")
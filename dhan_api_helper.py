@@ -1,5 +1,6 @@
 import logging
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import time
 from dhanhq import dhanhq
@@ -20,17 +21,25 @@ DHAN_ACCESS_TOKEN = config_manager.get("credentials", "dhan_access_token") or ""
 class RateLimiter:
     def __init__(self, calls_per_second=2):
         self.interval = 1.0 / calls_per_second
-        self.last_call = 0
+        self.next_slot = 0
         import threading
         self.lock = threading.Lock()
 
-    def wait(self):
+    def reserve(self):
+        """
+        Claims the next free slot and returns the seconds to wait for it (never sleeps).
+        Lets async callers share the same budget: `await asyncio.sleep(limiter.reserve())`.
+        """
         with self.lock:
-            now = time.time()
-            elapsed = now - self.last_call
-            if elapsed < self.interval:
-                time.sleep(self.interval - elapsed)
-            self.last_call = time.time()
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        return slot - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
 
 # --- RATE LIMITERS ---
 # Based on Dhan API Documentation:
@@ -45,6 +54,11 @@ order_limiter = RateLimiter(calls_per_second=10)
 # Legacy global alias (deprecated, pointing to data for backward compat if missed)
 api_rate_limiter = data_limiter
 
+# --- HTTP CONNECTION POOL ---
+# The SDK keeps one requests.Session per dhanhq object. Size its keep-alive pool
+# for the scanner's worker threads so TLS connections are reused, not re-opened.
+DHAN_HTTP_POOL = {"pool_connections": 4, "pool_maxsize": 10}
+
 def get_dhan_session():
     """
     Initializes and returns a DhanHQ session object.
@@ -59,8 +73,11 @@ def get_dhan_session():
             dhan_context = DhanContext(DHAN_CLIENT_ID, DHAN_ACCESS_TOKEN)
             dhan = dhanhq(dhan_context)
         else:
-            # Older versions: Use direct init
-            dhan = dhanhq(DHAN_CLIENT_ID, DHAN_ACCESS_TOKEN)
+            # Older versions: Use direct init (with pooled HTTPS session)
+            try:
+                dhan = dhanhq(DHAN_CLIENT_ID, DHAN_ACCESS_TOKEN, pool=DHAN_HTTP_POOL)
+            except TypeError:
+                dhan = dhanhq(DHAN_CLIENT_ID, DHAN_ACCESS_TOKEN)
         return dhan
 
     except Exception as e:
@@ -160,6 +177,99 @@ def load_dhan_instrument_map():
         logger.error(f"Error loading Dhan instrument map: {e}")
         return {}
 
+def intraday_date_range(days=5):
+    """
+    Returns the (fromDate, toDate) strings for a `charts/intraday` request covering
+    the last `days` days (toDate is tomorrow so today's candles are included).
+    """
+    now = datetime.now()
+    return (now - timedelta(days=days)).strftime("%Y-%m-%d"), (now + timedelta(days=1)).strftime("%Y-%m-%d")
+
+def build_intraday_request(token, symbol, interval="FIFTEEN_MINUTE", days=5, date_range=None):
+    """
+    Builds the Dhan V2 `charts/intraday` request for a symbol.
+    Returns the JSON payload dict (securityId, exchangeSegment, instrument, interval, fromDate, toDate).
+    date_range: precomputed (fromDate, toDate) from intraday_date_range(), reused across a scan.
+    """
+    from_date, to_date = date_range or intraday_date_range(days)
+    
+    # Map Interval
+    dhan_interval = 15
+    if interval == "FIVE_MINUTE":
+        dhan_interval = 5
+    if interval == "ONE_MINUTE":
+        dhan_interval = 1
+        
+    # Check if Index
+    is_index = ('NIFTY' in symbol.upper() or 'BANK' in symbol.upper() or 'SENSEX' in symbol.upper())
+    exch_segment = "IDX_I" if is_index else getattr(dhanhq, 'NSE', 'NSE_EQ')
+    instr_type = "INDEX" if is_index else "EQUITY"
+    
+    return {
+        "securityId": str(token),
+        "exchangeSegment": exch_segment,
+        "instrument": instr_type,
+        "interval": dhan_interval,
+        "fromDate": from_date,
+        "toDate": to_date
+    }
+
+def candles_to_frame(raw, symbol, interval="FIFTEEN_MINUTE"):
+    """
+    Converts a raw `charts/intraday` payload (column arrays) into an OHLCV DataFrame
+    resampled to `interval`. Returns None if the payload has no time key.
+    """
+    # Find Time Key
+    time_key = next((k for k in ['timestamp', 'start_Time', 'start_time', 'time'] if k in raw), None)
+    
+    if not time_key:
+        logger.warning(f"Candle Data Missing Time Key. Keys: {raw.keys()}")
+        return None
+    
+    # SUCCESS PATH: Process Data
+    # The payload is already columnar (one list per field), so each column is converted
+    # once, straight from its list. Epoch times go through a numeric array first:
+    # pandas converts a list of ints element by element (~3x slower).
+    times = raw[time_key]
+    if isinstance(times[0], (int, float)):
+        times = pd.to_datetime(np.asarray(times), unit='s')
+    else:
+        times = pd.to_datetime(times)
+    
+    # Columns are built at their final dtypes in one pass: float32 prices (ample for < 10^5 INR)
+    # + int32 volume halve the bytes pushed through the rolling/ewm indicator passes
+    # when scanning many symbols. Resampling below keeps these dtypes.
+    df = pd.DataFrame({
+        'datetime': times, 
+        'open': np.asarray(raw['open'], dtype=np.float32),
+        'high': np.asarray(raw['high'], dtype=np.float32),
+        'low': np.asarray(raw['low'], dtype=np.float32),
+        'close': np.asarray(raw['close'], dtype=np.float32),
+        'volume': np.asarray(raw['volume'], dtype=np.int32)
+    })
+    
+    resample_rule = '15min' if interval == "FIFTEEN_MINUTE" else '5min' if interval == "FIVE_MINUTE" else '1min'
+    
+    # Dhan already returns bars at the requested interval: when every bar sits on its own
+    # interval boundary (sorted, no gaps inside a bar, no NaNs), resampling is an identity
+    # and the frame is returned as built, skipping the bin grid over nights/weekends.
+    ts = df['datetime'].to_numpy()
+    if ts.dtype.kind == 'M':
+        ts = ts.astype('datetime64[ns]').view(np.int64)
+        step = pd.Timedelta(resample_rule).value
+        if (ts[1:] > ts[:-1]).all() and not (ts % step).any() and not df.isna().to_numpy().any():
+            return df
+    
+    # If data is 1-minute (likely), RESAMPLE to desired interval
+    df = df.set_index('datetime')
+    
+    ohlc_dict = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+    
+    df_resampled = df.resample(resample_rule).agg(ohlc_dict).dropna()
+    df_resampled = df_resampled.reset_index()
+    
+    return df_resampled
+
 def fetch_candle_data(dhan, token, symbol, interval="FIFTEEN_MINUTE", days=5):
     """
     Fetches historical candle data.
@@ -168,39 +278,26 @@ def fetch_candle_data(dhan, token, symbol, interval="FIFTEEN_MINUTE", days=5):
     Actually, Dhan V2 `charts/intraday` supports 1,5,15,25,60.
     """
     try:
-        to_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-        from_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-        
-        # Map Interval
-        dhan_interval = 15
-        if interval == "FIVE_MINUTE":
-            dhan_interval = 5
-        if interval == "ONE_MINUTE":
-            dhan_interval = 1
+        request = build_intraday_request(token, symbol, interval, days)
             
         # Rate Limit (Data API: 5/s)
         data_limiter.wait()
             
-        # Check if Index
-        is_index = ('NIFTY' in symbol.upper() or 'BANK' in symbol.upper() or 'SENSEX' in symbol.upper())
-        exch_segment = "IDX_I" if is_index else getattr(dhanhq, 'NSE', 'NSE_EQ')
-        instr_type = "INDEX" if is_index else "EQUITY"
-            
         try:
             # DhanHQ 1.3 intraday_minute_data does not take from_date
             data = dhan.intraday_minute_data(
-                security_id=str(token),
-                exchange_segment=exch_segment,
-                instrument_type=instr_type
+                security_id=request["securityId"],
+                exchange_segment=request["exchangeSegment"],
+                instrument_type=request["instrument"]
             )
         except TypeError:
             # Fallback if library signature differs
             data = dhan.intraday_minute_data(
-                security_id=str(token),
-                exchange_segment=exch_segment,
-                instrument_type=instr_type,
-                from_date=from_date,
-                to_date=to_date
+                security_id=request["securityId"],
+                exchange_segment=request["exchangeSegment"],
+                instrument_type=request["instrument"],
+                from_date=request["fromDate"],
+                to_date=request["toDate"]
             )
         # Note: Library `intraday_minute_data` usually implies 1-min?
         # If library doesn't expose 'interval' param, we get 1-min and resample.
@@ -209,34 +306,7 @@ def fetch_candle_data(dhan, token, symbol, interval="FIFTEEN_MINUTE", days=5):
         # But if function doesn't accept kwarg, we stick to defaults or resample.
         
         if data['status'] == 'success' and data.get('data'):
-             raw = data['data']
-             # Find Time Key
-             time_key = next((k for k in ['timestamp', 'start_Time', 'start_time', 'time'] if k in raw), None)
-             
-             if not time_key:
-                 logger.warning(f"Candle Data Missing Time Key. Keys: {raw.keys()}")
-                 return None
-             
-             # SUCCESS PATH: Process Data
-             df = pd.DataFrame({
-                 'datetime': pd.to_datetime(raw[time_key], unit='s' if isinstance(raw[time_key][0], (int, float)) else None), 
-                 'open': raw['open'],
-                 'high': raw['high'],
-                 'low': raw['low'],
-                 'close': raw['close'],
-                 'volume': raw['volume']
-             })
-             
-             # If data is 1-minute (likely), RESAMPLE to desired interval
-             df = df.set_index('datetime')
-             
-             resample_rule = '15min' if interval == "FIFTEEN_MINUTE" else '5min' if interval == "FIVE_MINUTE" else '1min'
-             ohlc_dict = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
-             
-             df_resampled = df.resample(resample_rule).agg(ohlc_dict).dropna()
-             df_resampled = df_resampled.reset_index()
-             
-             return df_resampled
+             return candles_to_frame(data['data'], symbol, interval)
 
         else:
              logger.warning(f"Candle Fetch Failed for {symbol}. Response: {data}")
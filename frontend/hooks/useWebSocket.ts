@@ -1,5 +1,5 @@
 import { useState, useEffect, useRef } from 'react';
-import { getWsUrl, getBaseUrl } from '@/lib/api';
+import { getWsUrl, getBaseUrl, applyStatePatch } from '@/lib/api';
 import axios from 'axios';
 
 import { MarketData } from '@/types';
@@ -44,6 +44,12 @@ export function useWebSocket() {
             socket.onmessage = (event) => {
                 try {
                     const parsed = JSON.parse(event.data);
+                    if (parsed.type === "ping") return; // Server heartbeat, not state
+                    if (parsed.op === "merge" && Array.isArray(parsed.path)) {
+                        // Partial update: merge only the changed subtree
+                        setData(prev => prev ? applyStatePatch(prev, parsed.path, parsed.value) : prev);
+                        return;
+                    }
                     setData(parsed);
                 } catch (e) {
                     console.error("Failed to parse WS message", e);
@@ -19,3 +19,26 @@ export const getWsUrl = () => {
     const apiUrl = getBaseUrl();
     return apiUrl.replace('http', 'ws') + '/ws';
 };
+
+// Applies a `{"op": "merge", "path": [...], "value": ...}` patch from the WS hub.
+// Objects at `path` are shallow-merged with `value`; anything else is replaced.
+export const applyStatePatch = <T extends object>(state: T, path: string[], value: unknown): T => {
+    if (path.length === 0) return state;
+
+    const root: Record<string, unknown> = { ...(state as Record<string, unknown>) };
+    let node = root;
+    for (const key of path.slice(0, -1)) {
+        const child = node[key];
+        node[key] = child && typeof child === 'object' ? { ...(child as Record<string, unknown>) } : {};
+        node = node[key] as Record<string, unknown>;
+    }
+
+    const last = path[path.length - 1];
+    const current = node[last];
+    const isPlainObject = (v: unknown) => !!v && typeof v === 'object' && !Array.isArray(v);
+    node[last] = isPlainObject(current) && isPlainObject(value)
+        ? { ...(current as Record<string, unknown>), ...(value as Record<string, unknown>) }
+        : value;
+
+    return root as T;
+};
@@ -1,51 +1,174 @@
 import pandas as pd
+import numpy as np
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _ema_kernel(values, alpha):
+        out = np.empty_like(values)
+        if len(values) == 0:
+            return out
+        out[0] = values[0]
+        for i in range(1, len(values)):
+            out[i] = alpha * values[i] + (1.0 - alpha) * out[i - 1]
+        return out
+
+    @njit(cache=True, error_model='numpy')
+    def _indicator_kernel(close, volume, vp, tr, days):
+        """
+        Fused single pass for calculate_indicators: EMA 20 (close), per-day VWAP,
+        EMA 20 (volume) and ATR 14, matching the _ema / cumsum path bar for bar.
+        """
+        n = len(close)
+        ema_20 = np.empty(n)
+        vwap = np.empty(n)
+        volume_ema = np.empty(n)
+        atr = np.empty(n)
+        alpha_20 = 2.0 / 21.0
+        alpha_14 = 2.0 / 15.0
+        vp_cum = 0.0
+        vol_cum = 0.0
+        for i in range(n):
+            if i == 0:
+                ema_20[i] = close[i]
+                volume_ema[i] = volume[i]
+                atr[i] = tr[i]
+            else:
+                ema_20[i] = alpha_20 * close[i] + (1.0 - alpha_20) * ema_20[i - 1]
+                volume_ema[i] = alpha_20 * volume[i] + (1.0 - alpha_20) * volume_ema[i - 1]
+                atr[i] = alpha_14 * tr[i] + (1.0 - alpha_14) * atr[i - 1]
+                if days[i] != days[i - 1]:
+                    vp_cum = 0.0
+                    vol_cum = 0.0
+            vp_cum += vp[i]
+            vol_cum += volume[i]
+            vwap[i] = vp_cum / vol_cum
+        return ema_20, vwap, volume_ema, atr
+
+    @njit(cache=True)
+    def _last_ema_kernel(values, alpha):
+        ema = values[0]
+        for i in range(1, len(values)):
+            ema = alpha * values[i] + (1.0 - alpha) * ema
+        return ema
+
+
+def _ema(series, span):
+    """
+    EMA equivalent to series.ewm(span=span, adjust=False).mean().
+    Uses a compiled Numba recurrence when available (NaN-free input only),
+    otherwise falls back to pandas.
+    """
+    if HAS_NUMBA:
+        values = series.to_numpy(dtype=np.float64)
+        if not np.isnan(values).any():
+            return pd.Series(_ema_kernel(values, 2.0 / (span + 1.0)), index=series.index)
+    return series.ewm(span=span, adjust=False).mean()
+
+
+def last_ema(series, span):
+    """
+    Latest value of _ema(series, span), without materializing the full series.
+    For callers that only read the final EMA (no VWAP/ATR needed).
+    """
+    if HAS_NUMBA:
+        values = series.to_numpy(dtype=np.float64)
+        if len(values) and not np.isnan(values).any():
+            return _last_ema_kernel(values, 2.0 / (span + 1.0))
+    return series.ewm(span=span, adjust=False).mean().iloc[-1]
+
 
 def calculate_indicators(df):
     """
-    Calculates VWAP and EMA 20 using standard Pandas.
+    Calculates VWAP and EMA 20 (plus Volume EMA and ATR) on the column arrays.
     Expects df to have columns: datetime, open, high, low, close, volume
     """
     if df is None or len(df) < 20:
         return None
     
-    # EMA 20
-    df['EMA_20'] = df['close'].ewm(span=20, adjust=False).mean()
-    
     # VWAP (Intraday / Cumulative)
     # Standard formula: Cumulative(Volume * TypicalPrice) / Cumulative(Volume)
     # This calculates a "Rolling" VWAP from the start of the fetched data.
     # Since we strictly fetch 10 days of 15 min data, this might be a multi-day VWAP.
     # To act like an Intraday VWAP, we should group by Day.
     
-    df['typical_price'] = (df['high'] + df['low'] + df['close']) / 3
-    df['vp'] = df['volume'] * df['typical_price']
+    # The math below runs on the raw column arrays (no index alignment / per-op pandas overhead)
+    high = df['high'].to_numpy()
+    low = df['low'].to_numpy()
+    close = df['close'].to_numpy()
+    volume = df['volume'].to_numpy()
+    
+    typical_price = (high + low + close) / 3
+    vp = volume * typical_price
     
     # Group by Date to reset VWAP each day (Standard Intraday VWAP)
     # Check if 'datetime' is column or index
     if 'datetime' in df.columns:
-        date_series = df['datetime'].dt.date
+        dt = df['datetime']
+        if dt.dt.tz is not None:
+            dt = dt.dt.tz_localize(None) # Wall-clock dates, like .dt.date
+        days = dt.to_numpy().astype('datetime64[D]')
     else:
-        date_series = df.index.date
-
-    df['VWAP'] = df.groupby(date_series)['vp'].cumsum() / df.groupby(date_series)['volume'].cumsum()
-    
-    # Volume SMA 20
-    df['Volume_SMA_20'] = df['volume'].ewm(span=20, adjust=False).mean()
+        idx = df.index
+        if idx.tz is not None:
+            idx = idx.tz_localize(None)
+        days = idx.to_numpy().astype('datetime64[D]')
     
     # ATR 14 Calculation (Manual TR) for Dynamic SL
-    high = df['high']
-    low = df['low']
-    close = df['close']
-    prev_close = close.shift(1)
-    
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
     tr1 = high - low
-    tr2 = (high - prev_close).abs()
-    tr3 = (low - prev_close).abs()
-    
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    df['ATR'] = tr.ewm(span=14, adjust=False).mean()
-
-    return df
+    tr2 = np.abs(high - prev_close)
+    tr3 = np.abs(low - prev_close)
+    
+    # fmax skips the NaN prev_close on the first bar (like DataFrame.max)
+    tr = np.fmax(tr1, np.fmax(tr2, tr3))
+    
+    # Accumulate in float64: candles may arrive downcast (float32 / int32 volume),
+    # and a full day's cumulative volume can overflow int32 on heavily traded names
+    close_64 = close.astype(np.float64)
+    volume_64 = volume.astype(np.float64)
+    tr_64 = tr.astype(np.float64)
+    if HAS_NUMBA and not (np.isnan(close_64).any() or np.isnan(volume_64).any() or np.isnan(tr_64).any()):
+        # All four indicators in one fused compiled pass over the bars
+        ema_20, vwap, volume_ema, atr = _indicator_kernel(
+            close_64, volume_64, vp.astype(np.float64), tr_64, days.view(np.int64)
+        )
+    else:
+        ema_20 = _ema(df['close'], 20)
+        volume_ema = _ema(df['volume'], 20)
+        atr = _ema(pd.Series(tr, index=df.index), 14)
+        
+        # Candles are in time order, so each day is one contiguous run: cumsum per run.
+        vp_cum = np.empty(len(df), dtype=np.float64)
+        vol_cum = np.empty(len(df), dtype=np.float64)
+        bounds = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(df)]):
+            np.cumsum(vp[start:end], dtype=np.float64, out=vp_cum[start:end])
+            np.cumsum(volume[start:end], dtype=np.float64, out=vol_cum[start:end])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = vp_cum / vol_cum
+    
+    indicator_cols = pd.DataFrame({
+        'EMA_20': ema_20,
+        'typical_price': typical_price,
+        'vp': vp,
+        'VWAP': vwap,
+        'Volume_SMA_20': volume_ema, # Volume SMA 20
+        'ATR': atr
+    }, index=df.index)
+    
+    # Attach all columns in one concat (six separate inserts cost more than the math above)
+    stale = indicator_cols.columns.intersection(df.columns)
+    if len(stale):
+        df = df.drop(columns=stale)
+    return pd.concat([df, indicator_cols], axis=1)
 
 
 def check_buy_condition(df, current_price=None, extension_limit=1.5):
@@ -62,16 +185,21 @@ def check_buy_condition(df, current_price=None, extension_limit=1.5):
     if len(df) < 2:
         return False, "Not enough data"
         
-    last_row = df.iloc[-2]
+    # Scalars are read straight off the column arrays: building a mixed-dtype row
+    # Series (iloc) per call costs more than all the checks below combined.
+    def value_at(col, pos=-2, default=None):
+        return df[col].to_numpy()[pos] if col in df.columns else default
     
     # Extract Indicators (Strictly from Confirmed Candle)
-    ema_20 = last_row.get('EMA_20')
-    vwap = last_row.get('VWAP')
-    vol_sma = last_row.get('Volume_SMA_20')
-    closed_vol = last_row.get('volume') # From iloc[-2] (Completed Candle)
-    open_price = last_row.get('open')
-    close_price = last_row.get('close')
-    datetime_str = str(last_row.get('datetime', 'Unknown'))
+    ema_20 = value_at('EMA_20')
+    vwap = value_at('VWAP')
+    vol_sma = value_at('Volume_SMA_20')
+    closed_vol = value_at('volume') # From iloc[-2] (Completed Candle)
+    open_price = value_at('open')
+    close_price = value_at('close')
+    high_price = value_at('high')
+    low_price = value_at('low')
+    datetime_str = str(value_at('datetime', default='Unknown'))
     
     # User Request: Price checks must match the candle exactly.
     # We IGNORE current_price for the Logic Check.
@@ -104,8 +232,8 @@ def check_buy_condition(df, current_price=None, extension_limit=1.5):
          # 2.1 Wick Rejection Filter (Only on Green Candles)
          # Reject if Upper Wick > 40% of Total Range (Shooting Star / Rejection)
          # Refinement: Consider Volume Context
-         high = last_row['high']
-         low = last_row['low']
+         high = high_price
+         low = low_price
          upper_wick = high - close_price # For Green, Close is Max (safe)
          total_range = high - low
          
@@ -113,12 +241,12 @@ def check_buy_condition(df, current_price=None, extension_limit=1.5):
              reasons.append("Flat Candle (High = Low)")
          else:
              wick_pct = upper_wick / total_range
-             candle_range_pct = (total_range / last_row['open']) * 100
+             candle_range_pct = (total_range / open_price) * 100
              
              # Skip Wick Filter if candle is tiny (< 0.15% - Noise)
              if candle_range_pct >= 0.15:
                  # Pre-calculate Vol Ratio for Context
-                 current_vol = last_row.get('volume', 0)
+                 current_vol = value_at('volume', default=0)
                  avg_vol = vol_sma if vol_sma > 0 else 1
                  vol_ratio = current_vol / avg_vol
                  
@@ -146,7 +274,7 @@ def check_buy_condition(df, current_price=None, extension_limit=1.5):
     
     # Use pre-calculated candle_range_pct if available, else calc
     if 'candle_range_pct' not in locals():
-        candle_range_pct = ((last_row['high'] - last_row['low']) / last_row['open']) * 100
+        candle_range_pct = ((high_price - low_price) / open_price) * 100
         
     if candle_range_pct > max_candle_range:
         reasons.append(f"Huge Candle ({candle_range_pct:.2f}% > Limit {max_candle_range}%)")
@@ -159,13 +287,13 @@ def check_buy_condition(df, current_price=None, extension_limit=1.5):
              
         # Only return SNIPER_ALERT instead of Strong Buy based on the stricter logic requirements
         # Additional Impulse Check: Must close above previous candle high
-        prev_high = df.iloc[-3]['high'] if len(df) >= 3 else 0.0
+        prev_high = value_at('high', pos=-3) if len(df) >= 3 else 0.0
         if close_price <= prev_high:
              return False, "Not an Impulse: Close <= Previous High"
              
         # Additional Impulse Check: Candle body > 60% of total range
         body_size = abs(close_price - open_price)
-        total_range = last_row['high'] - last_row['low']
+        total_range = high_price - low_price
         if total_range > 0 and (body_size / total_range) <= 0.60:
              return False, f"Weak Body: Body is {(body_size / total_range)*100:.0f}% of range (Needs > 60%)"
 
@@ -303,10 +431,10 @@ def check_15m_bias(df):
     import pandas as pd
     if df is None or df.empty or len(df) < 5:
         return 'NEUTRAL', "Insufficient data for 15M bias"
-    latest = df.iloc[-2]
-    price = latest['close']
-    vwap = latest.get('VWAP')
-    ema_20 = latest.get('EMA_20')
+    # Last completed candle, read straight off the column arrays (no per-row Series)
+    price = df['close'].to_numpy()[-2]
+    vwap = df['VWAP'].to_numpy()[-2] if 'VWAP' in df.columns else None
+    ema_20 = df['EMA_20'].to_numpy()[-2] if 'EMA_20' in df.columns else None
     if pd.isna(vwap) or pd.isna(ema_20):
         return 'NEUTRAL', "Missing VWAP/EMA20 on 15M"
     
@@ -330,20 +458,15 @@ def check_chop_filter(df):
     
     # 1. VWAP Chop Check (Zig-Zag around VWAP)
     # Count how many times price crossed VWAP in last 10 candles
-    recent = df.iloc[-10:]
+    # (read off the column arrays: no per-row Series on this per-symbol scan path)
     crosses = 0
-    was_above = None
-    
-    for i, row in recent.iterrows():
-        close = row['close']
-        vwap = row.get('VWAP')
+    if 'VWAP' in df.columns:
+        close = df['close'].to_numpy()[-10:]
+        vwap = df['VWAP'].to_numpy()[-10:]
         # FIX: Handle 0.0 correctly (pd.isna allows 0, but rejects NaN/None)
-        if pd.isna(vwap): continue
-        
-        is_above = close >= vwap
-        if was_above is not None and is_above != was_above:
-            crosses += 1
-        was_above = is_above
+        valid = ~pd.isna(vwap)
+        is_above = close[valid] >= vwap[valid]
+        crosses = int(np.count_nonzero(is_above[1:] != is_above[:-1]))
         
     if crosses >= 4:
         # Too many crosses = CHOP
@@ -352,8 +475,9 @@ def check_chop_filter(df):
     # 2. EMA Slope Check (Trend Strength)
     # Compare EMA20 now vs 5 candles ago
     # FIX: Use completed candle (iloc[-2]) and 5 bars prior (iloc[-7]) 
-    current_ema = df.iloc[-2].get('EMA_20')
-    past_ema = df.iloc[-7].get('EMA_20') 
+    ema_20 = df['EMA_20'].to_numpy() if 'EMA_20' in df.columns else None
+    current_ema = ema_20[-2] if ema_20 is not None else None
+    past_ema = ema_20[-7] if ema_20 is not None else None
     
     if pd.notna(current_ema) and pd.notna(past_ema) and past_ema != 0:
         # FIX: Remove abs() - Long-only strategy needs POSITIVE slope
@@ -365,6 +489,33 @@ def check_chop_filter(df):
 
     return True, "Trend Clean"
 
+def evaluate_entry(df_5m, extension_limit):
+    """
+    5M stage of the scan: indicators, chop filter and entry check.
+    Pure module-level function (this module only needs pandas/numpy) so the
+    scanner can run it in a worker process.
+    Returns (stage, message, last_close, last_ema_20) with stage 'CHOP', 'BUY' or 'REJECT'.
+    """
+    if 'EMA_20' not in df_5m.columns:
+        df_5m = calculate_indicators(df_5m) # Calc indicators for 5m
+    
+    # Step 1.5: Check Chop Filter (Avoid Sideways Action)
+    is_clean, chop_reason = check_chop_filter(df_5m)
+    if not is_clean:
+        return 'CHOP', chop_reason, None, None
+    
+    # Step 2: Check 5M Entry Signal
+    screener_ltp = 0.0
+    buy_signal, message = check_buy_condition(df_5m, current_price=screener_ltp, extension_limit=extension_limit)
+    if buy_signal:
+        return 'BUY', message, None, None
+    
+    # Last values for the rejection log, read off the raw arrays (no per-row Series)
+    close_p = df_5m['close'].to_numpy()[-1]
+    ema_20 = df_5m['EMA_20'].to_numpy()[-1] if 'EMA_20' in df_5m.columns else 0
+    return 'REJECT', message, close_p, ema_20
+
+
 def calculate_sr_levels(df):
     """
     Calculates Previous Day High/Low (PDH, PDL) and Current Day High/Low (CDH, CDL).
@@ -447,27 +598,25 @@ def get_dynamic_sr_levels(df, prd=10, max_pivots=20, channel_w_pct=10, max_sr=5,
     if df is None or len(df) < prd * 2:
         return []
         
-    df = df.copy()
+    high = df['high'].to_numpy()
+    low = df['low'].to_numpy()
     
-    # Calculate rolling highest/lowest for channel width calculation (300 bars)
-    prd_highest = df['high'].rolling(300, min_periods=1).max().iloc[-1]
-    prd_lowest = df['low'].rolling(300, min_periods=1).min().iloc[-1]
+    # Calculate highest/lowest of the last 300 bars for channel width calculation
+    # (only the final rolling value was used, so reduce the tail directly)
+    prd_highest = high[-300:].max()
+    prd_lowest = low[-300:].min()
     
     # 1. Identify Pivot Highs and Lows
     # A pivot is a local max/min over a window of 2*prd + 1
-    df['roll_high'] = df['high'].rolling(window=2*prd+1, center=True).max()
-    df['roll_low'] = df['low'].rolling(window=2*prd+1, center=True).min()
-    
-    # Extract Pivot bars
-    pivot_bars = df[(df['high'] == df['roll_high']) | (df['low'] == df['roll_low'])]
-    
-    pivots = []
-    # Match chronological order
-    for _, row in pivot_bars.iterrows():
-        if row['high'] == row['roll_high']:
-            pivots.append(row['high'])
-        if row['low'] == row['roll_low']:
-            pivots.append(row['low'])
+    roll_high = df['high'].rolling(window=2*prd+1, center=True).max().to_numpy()
+    roll_low = df['low'].rolling(window=2*prd+1, center=True).min().to_numpy()
+    is_pivot_high = high == roll_high
+    is_pivot_low = low == roll_low
+    
+    # Match chronological order (per bar: pivot high first, then pivot low)
+    pivot_pairs = np.column_stack([high, low])
+    pivot_mask = np.column_stack([is_pivot_high, is_pivot_low])
+    pivots = pivot_pairs[pivot_mask].tolist()
             
     # Keep only the last `max_pivots` (e.g. 20)
     pivots = pivots[-max_pivots:]
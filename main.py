@@ -4,15 +4,21 @@ import sys
 import asyncio
 import pandas as pd
 import threading
+import multiprocessing
 from scraper import fetch_top_performing_sectors, fetch_stocks_in_sector, fetch_market_indices
 from dhan_api_helper import get_dhan_session, load_dhan_instrument_map, fetch_candle_data, fetch_ltp, fetch_net_positions, place_order_api, fetch_holdings, verify_order_status, fetch_market_feed_bulk
 from indicators import calculate_indicators, check_buy_condition
 from utils import is_market_open, get_ist_now
 from config import config_manager
-from state_manager import load_state, save_state, start_auto_save, state_lock
+from state_manager import load_state, save_state, start_auto_save, state_lock, publish_snapshot, SNAPSHOT_MIN_INTERVAL
 from database import log_trade_to_db
 from async_scanner import AsyncScanner
 from telegram_helper import send_telegram_message
+try:
+    import uvloop  # libuv-based event loop for the scanner (optional, not on Windows)
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
 
 # Configure Logging
 import datetime
@@ -26,7 +32,9 @@ class LogBufferHandler(logging.Handler):
     def emit(self_instance, record):
         try:
             log_entry = self_instance.format(record)
-            # Append to global shared buffer
+            # Append to global shared buffer.
+            # No state_lock here (a thread holding it may be waiting on this handler's lock);
+            # the "logs" key exists from startup, so this never resizes BOT_STATE under a reader.
             if "BOT_STATE" in globals():
                 if "logs" not in BOT_STATE:
                     BOT_STATE["logs"] = []
@@ -55,10 +63,11 @@ if root_logger.hasHandlers():
 
 root_logger.addHandler(stream_handler)
 
-# File Handler
-file_handler = logging.FileHandler("trading_bot.log")
-file_handler.setFormatter(formatter)
-root_logger.addHandler(file_handler)
+# File Handler (main process only; scan pool workers log to stdout)
+if multiprocessing.parent_process() is None:
+    file_handler = logging.FileHandler("trading_bot.log")
+    file_handler.setFormatter(formatter)
+    root_logger.addHandler(file_handler)
 
 # UI Buffer Handler
 buffer_handler = LogBufferHandler()
@@ -72,11 +81,18 @@ logging.getLogger("httpcore").setLevel(logging.WARNING)
 logger = logging.getLogger("MainBot")
 
 # --- GLOBAL STATE INITIALIZATION ---
-# Load state from disk or use default
-BOT_STATE = load_state()
-
-# Start background auto-save (every 60s to reduce log spam)
-start_auto_save(BOT_STATE, interval=60)
+if multiprocessing.parent_process() is None:
+    # Load state from disk or use default
+    BOT_STATE = load_state()
+    BOT_STATE.setdefault("logs", []) # Log buffer handler appends without state_lock
+    publish_snapshot(BOT_STATE)
+
+    # Start background auto-save (every 60s to reduce log spam)
+    start_auto_save(BOT_STATE, interval=60)
+else:
+    # Scan pool worker (spawn re-imports this module): it only runs evaluate_entry
+    # and must never load, publish or auto-save the bot state
+    BOT_STATE = {}
 # -----------------------------------
 
 # === ORDER IDEMPOTENCY HELPERS ===
@@ -264,6 +280,7 @@ def place_buy_order(dhan, symbol, token, qty, correlation_id=None):
 # Shared State for API
 DHAN_API_SESSION = None
 TOKEN_MAP = {}
+SESSION_READY = False # Flipped once the Dhan session + token map are loaded
 
 
 
@@ -594,7 +611,8 @@ def calculate_structure_based_sl(df, entry_price, vwap, ema20):
     # 4. Select First within Max Distance
     for cand in enhanced_candidates:
          if cand["dist"] <= max_sl_distance:
-             return cand["sl"], f"{cand['reason']} ({cand['dist']:.2f}%)", cand["dist"]
+             # Plain floats: candle/indicator values are numpy float32 and this SL goes into BOT_STATE
+             return float(cand["sl"]), f"{cand['reason']} ({cand['dist']:.2f}%)", float(cand["dist"])
              
     # 5. Reject if all too wide
     best_candidate_dist = enhanced_candidates[0]["dist"]
@@ -705,7 +723,7 @@ def calculate_structure_based_tp(entry_price, sl_price, df, previous_day_high=No
     if rr_ratio < min_rr:
         return None, f"R:R too low ({rr_ratio:.2f})", rr_ratio
     
-    return best_tp, f"{reason} (R:R {rr_ratio:.1f})", rr_ratio
+    return float(best_tp), f"{reason} (R:R {rr_ratio:.1f})", float(rr_ratio)
 
 
 def manage_positions(dhan, token_map):
@@ -1137,7 +1155,7 @@ def run_bot_loop(async_loop=None, ws_manager=None):
     Background task to run the bot loop.
     Accepts async_loop and ws_manager to broadcast updates via WebSockets.
     """
-    global BOT_STATE, DHAN_API_SESSION, TOKEN_MAP
+    global BOT_STATE, DHAN_API_SESSION, TOKEN_MAP, SESSION_READY
     BOT_STATE["is_running"] = True
     
     logger.info("Starting Auto Buy/Sell Bot...")
@@ -1146,8 +1164,12 @@ def run_bot_loop(async_loop=None, ws_manager=None):
     def broadcast_state():
         if async_loop and ws_manager:
             try:
-                # Inject Heartbeat for Frontend Debugging
-                BOT_STATE["last_heartbeat"] = time.time()
+                with state_lock:
+                    # Inject Heartbeat for Frontend Debugging
+                    BOT_STATE["last_heartbeat"] = time.time()
+                    
+                    # Refresh the read snapshot served by /data (throttled; save_state always refreshes it)
+                    publish_snapshot(BOT_STATE, min_interval=SNAPSHOT_MIN_INTERVAL)
                 
                 # logger.info("Broadcasting State Update...") 
                 future = asyncio.run_coroutine_threadsafe(ws_manager.broadcast(BOT_STATE), async_loop)
@@ -1171,7 +1193,8 @@ def run_bot_loop(async_loop=None, ws_manager=None):
         while BOT_STATE.get("is_running", True):
             try:
                 # Update Heartbeat
-                BOT_STATE.setdefault("heartbeat", {})["position_manager"] = time.time()
+                with state_lock:
+                    BOT_STATE.setdefault("heartbeat", {})["position_manager"] = time.time()
                 
                 # Check Market Status
                 is_open, _ = is_market_open()
@@ -1221,6 +1244,7 @@ def run_bot_loop(async_loop=None, ws_manager=None):
         return
         
     TOKEN_MAP = token_map
+    SESSION_READY = True
 
     # 3. Start Position Manager Thread
     pm_thread = threading.Thread(target=run_position_manager, args=(dhan, token_map), daemon=True)
@@ -1231,7 +1255,8 @@ def run_bot_loop(async_loop=None, ws_manager=None):
         time.sleep(10)  # Initial delay to let bot initialize
         while BOT_STATE.get("is_running", True):
             try:
-                BOT_STATE.setdefault("heartbeat", {})["reconciliation"] = time.time()
+                with state_lock:
+                    BOT_STATE.setdefault("heartbeat", {})["reconciliation"] = time.time()
                 
                 # Check Market Status
                 is_open, _ = is_market_open()
@@ -1255,7 +1280,8 @@ def run_bot_loop(async_loop=None, ws_manager=None):
         time.sleep(60)  # Initial delay
         while BOT_STATE.get("is_running", True):
             try:
-                BOT_STATE.setdefault("heartbeat", {})["cleanup"] = time.time()
+                with state_lock:
+                    BOT_STATE.setdefault("heartbeat", {})["cleanup"] = time.time()
                 
                 # Check Market Status (Cleanup might be allowed post-market, but let's restrict to save API)
                 is_open, _ = is_market_open()
@@ -1317,7 +1343,8 @@ def run_bot_loop(async_loop=None, ws_manager=None):
         logger.info("🎯 Sniper Execution Thread started (45s interval)")
         while BOT_STATE.get("is_running", True):
             try:
-                BOT_STATE.setdefault("heartbeat", {})["sniper_execution"] = time.time()
+                with state_lock:
+                    BOT_STATE.setdefault("heartbeat", {})["sniper_execution"] = time.time()
                 
                 # Check Market Status
                 is_open, _ = is_market_open()
@@ -1400,7 +1427,7 @@ def run_bot_loop(async_loop=None, ws_manager=None):
                              expired_symbols.append(symbol)
                              
                              recent_1m = df_1m.iloc[-6:-1]
-                             sl_price = recent_1m['low'].min()
+                             sl_price = float(recent_1m['low'].min()) # Plain float (stored in BOT_STATE)
                              buffered_sl = sl_price * 0.999
                              
                              live_ltp = fetch_ltp(api_session, token, symbol)
@@ -1506,6 +1533,11 @@ def run_bot_loop(async_loop=None, ws_manager=None):
     except Exception as e:
         logger.error(f"Failed to start Dhan Order WebSocket: {e}")
 
+    # Persistent scanner + event loop: keeps the scanner's aiohttp pool alive between cycles
+    # (asyncio.run() would tear the loop, and every connection bound to it, down each scan)
+    scan_loop = uvloop.new_event_loop() if HAS_UVLOOP else asyncio.new_event_loop()
+    scanner = None
+
     try:
         while True:
             logger.info("Starting Main Loop Iteration...")
@@ -1617,13 +1649,12 @@ def run_bot_loop(async_loop=None, ws_manager=None):
                     # Fallback to direct symbol token.
                     nifty_df = fetch_candle_data(dhan, nifty_token, "NIFTY 50", "ONE_MINUTE")
                     if nifty_df is not None and len(nifty_df) > 20:
-                        from indicators import calculate_indicators
-                        nifty_df = calculate_indicators(nifty_df)
-                        latest_nifty = nifty_df.iloc[-1]
+                        # Only the latest close/EMA 20 are used: skip the full indicator frame
+                        from indicators import last_ema
                         
                         BOT_STATE["nifty_1m"] = {
-                            "close": latest_nifty.get('close', 0),
-                            "ema20": latest_nifty.get('EMA_20', 0),
+                            "close": float(nifty_df['close'].iloc[-1]),
+                            "ema20": float(last_ema(nifty_df['close'], 20)),
                             "timestamp": time.time()
                         }
                     else:
@@ -1735,9 +1766,12 @@ def run_bot_loop(async_loop=None, ws_manager=None):
     
                 # -- ASYNC BATCH SCAN --
                 if stocks_to_scan:
-                    # Initialize Scanner with fresh SmartAPI Session Object
+                    # Initialize Scanner once; refresh its SmartAPI Session Object every cycle
                     # Legacy: Pass token. New: Pass dhan object for robustness.
-                    scanner = AsyncScanner("UNUSED_TOKEN", smartApi=dhan)
+                    if scanner is None:
+                        # general.scan_cpu_workers caps the 5M check process pool (unset/1 = inline, > 1 = worker processes)
+                        scanner = AsyncScanner("UNUSED_TOKEN", smartApi=dhan, cpu_workers=config_manager.get("general", "scan_cpu_workers"))
+                    scanner.smartApi = dhan # Pick up re-authenticated sessions
                     
                     # Fetch Persistent Index Memory (High/Low Cache)
                     # This fixes the "Post-Market 0.0" data issue by remembering valid High/Low from earlier.
@@ -1746,9 +1780,11 @@ def run_bot_loop(async_loop=None, ws_manager=None):
                     try:
                         # Run Async Scan (Blocking Call)
                         # Protected against Event Loop conflicts
-                        signals = asyncio.run(scanner.scan(stocks_to_scan, token_map, index_memory))
+                        # Optional cap on signals per scan (limits.max_signals_per_scan, unset = scan all)
+                        max_signals = config_manager.get("limits", "max_signals_per_scan")
+                        signals = scan_loop.run_until_complete(scanner.scan(stocks_to_scan, token_map, index_memory, max_signals))
                     except RuntimeError as re:
-                         # This catches "asyncio.run() cannot be called from a running event loop"
+                         # This catches "Cannot run the event loop while another loop is running"
                          logger.critical(f"CRITICAL ASYNCIO ERROR: {re}. Is the bot passing an existing loop?")
                          # Fallback: Try using the existing loop if available (dangerous but worth a shot in emergency)
                          # For now, just skip scan to keep bot alive
@@ -2105,6 +2141,13 @@ def run_bot_loop(async_loop=None, ws_manager=None):
     except Exception as e:
         logger.critical(f"Critical Bot Loop Crash: {e}", exc_info=True)
         time.sleep(10)
+    finally:
+        try:
+            if scanner is not None:
+                scan_loop.run_until_complete(scanner.aclose())
+            scan_loop.close()
+        except Exception as e:
+            logger.error(f"Scanner Shutdown Error: {e}")
     BOT_STATE["is_running"] = False
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ import time
 import asyncio
 from dhanhq import DhanContext, OrderUpdate
 from config import config_manager
+from state_manager import state_lock
 
 logger = logging.getLogger("DhanSmartWS")
 
@@ -29,7 +30,8 @@ class OrderUpdateWS:
             
             # Optional: Update Heartbeat for monitoring (even if not critical)
             if self.bot_state:
-                self.bot_state.setdefault("heartbeat", {})["websocket"] = time.time()
+                with state_lock:
+                    self.bot_state.setdefault("heartbeat", {})["websocket"] = time.time()
         except Exception as e:
             logger.error(f"❌ Error processing order update: {e}")
 
@@ -1,8 +1,10 @@
 import json
 import os
+import copy
 import logging
 import threading
 import time
+from types import MappingProxyType
 from database import get_remote_state, save_remote_state
 
 STATE_FILE = "bot_state.json"
@@ -11,6 +13,38 @@ logger = logging.getLogger(__name__)
 # Global Lock for BOT_STATE access
 state_lock = threading.RLock()
 
+# Immutable snapshot of BOT_STATE for read-only consumers (API endpoints).
+# Writers publish a fresh copy under state_lock; swapping the list slot is atomic
+# in CPython, so readers never need state_lock.
+_state_snapshot = [MappingProxyType({})]
+_last_publish = [0.0]
+
+SNAPSHOT_MIN_INTERVAL = 2.0 # seconds between heartbeat-driven snapshot refreshes
+
+def publish_snapshot(state, min_interval=0):
+    """
+    Publishes a deep copy of BOT_STATE as the current read snapshot.
+    Copies under state_lock, so writers of BOT_STATE must hold it too.
+    With min_interval, skips the copy if a snapshot was published that recently.
+    """
+    with state_lock:
+        now = time.monotonic()
+        if min_interval and now - _last_publish[0] < min_interval:
+            return
+        try:
+            snapshot = copy.deepcopy(state)
+        except Exception as e:
+            logger.error(f"Failed to publish state snapshot, /data keeps the previous one: {e}")
+            return
+        _state_snapshot[0] = MappingProxyType(snapshot)
+        _last_publish[0] = now
+
+def get_state_snapshot():
+    """
+    Returns the latest published BOT_STATE snapshot (read-only, lock-free).
+    """
+    return _state_snapshot[0]
+
 def load_state():
     """
     Loads BOT_STATE from Supabase (priority) or disk (fallback).
@@ -59,6 +93,12 @@ def load_state():
             logger.info("No persistence file found. Starting fresh.")
             return default_state
 
+def _json_default(obj):
+    """Encodes numpy scalars (e.g. float32 candle values) that reach BOT_STATE as plain numbers."""
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 def save_state(state):
     """
     Saves BOT_STATE to Supabase and disk.
@@ -67,12 +107,17 @@ def save_state(state):
     try:
         with state_lock:
             # 1. Save to Local Disk (Backup/Fast Access)
+            # Encoded before the file is opened, so an unencodable value can't truncate it
+            payload = json.dumps(state, indent=4, default=_json_default)
             with open(STATE_FILE, "w") as f:
-                json.dump(state, f, indent=4)
+                f.write(payload)
             
             # 2. Save to Supabase (Async/Background ideally, but sync for safety now)
             save_remote_state(state)
             
+            # 3. Refresh the read snapshot for API consumers
+            publish_snapshot(state)
+            
     except Exception as e:
         logger.error(f"Error saving state: {e}")
 
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("dhanhq")
+pytest.importorskip("supabase")
+
+import state_manager
+from dhan_api_helper import candles_to_frame
+
+
+def _frame():
+    start = 1_700_000_100  # on a 5-minute boundary
+    raw = {
+        "timestamp": [start + i * 300 for i in range(6)],
+        "open": [100.0, 101.0, 102.0, 101.5, 103.0, 104.0],
+        "high": [101.0, 102.5, 102.8, 103.2, 104.1, 105.0],
+        "low": [99.5, 100.6, 101.1, 101.0, 102.4, 103.3],
+        "close": [100.8, 102.0, 101.6, 103.0, 104.0, 104.6],
+        "volume": [1200, 900, 1500, 1100, 2000, 1800],
+    }
+    return candles_to_frame(raw, "TEST", "FIVE_MINUTE")
+
+
+def test_save_state_round_trips_candle_values(tmp_path, monkeypatch):
+    df = _frame()
+    assert df['low'].dtype == np.float32
+
+    state_file = tmp_path / "bot_state.json"
+    monkeypatch.setattr(state_manager, "STATE_FILE", str(state_file))
+    monkeypatch.setattr(state_manager, "save_remote_state", lambda state: None)
+
+    # Values taken straight off the frame, as the sniper / NIFTY paths read them
+    sl = df['low'].iloc[-5:].min() * 0.999
+    state = {
+        "positions": {"TEST": {"sl": sl, "original_sl": sl, "status": "OPEN"}},
+        "nifty_1m": {"close": df['close'].iloc[-1], "volume": df['volume'].iloc[-1]},
+    }
+    state_manager.save_state(state)
+
+    with open(state_file) as f:
+        saved = json.load(f)
+    assert saved["positions"]["TEST"]["sl"] == pytest.approx(float(sl))
+    assert saved["nifty_1m"]["close"] == pytest.approx(float(df['close'].iloc[-1]))
+    assert saved["nifty_1m"]["volume"] == 1800
+    assert state_manager.get_state_snapshot()["positions"]["TEST"]["status"] == "OPEN"
+
+
+def test_save_state_keeps_last_file_on_unencodable_value(tmp_path, monkeypatch):
+    state_file = tmp_path / "bot_state.json"
+    monkeypatch.setattr(state_manager, "STATE_FILE", str(state_file))
+    monkeypatch.setattr(state_manager, "save_remote_state", lambda state: None)
+
+    state_manager.save_state({"positions": {}})
+    state_manager.save_state({"positions": {}, "bad": object()})
+
+    with open(state_file) as f:
+        assert json.load(f) == {"positions": {}}
@@ -2,9 +2,17 @@ from fastapi import WebSocket
 from typing import List
 
 import logging
+import orjson
 
 logger = logging.getLogger("WebSocket")
 
+# numpy scalars (from pandas indicators) end up in BOT_STATE; anything else unknown is stringified
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def dumps_text(message) -> str:
+    """Serializes a message to a JSON string with orjson."""
+    return orjson.dumps(message, default=str, option=ORJSON_OPTIONS).decode()
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
@@ -34,11 +42,23 @@ class ConnectionManager:
             logger.info(f"WebSocket Client Disconnected. Total: {len(self.active_connections)}")
 
     async def broadcast(self, message: dict):
+        # Serialize once for all clients
+        await self._send_all(dumps_text(message))
+
+    async def broadcast_patch(self, path: list, value):
+        """
+        Broadcasts only the changed subtree of BOT_STATE.
+        Clients merge `value` into their copy at `path` (e.g. ["positions", "RELIANCE"]).
+        """
+        await self._send_all(dumps_text({"op": "merge", "path": path, "value": value}))
+
+    async def _send_all(self, payload: str):
+        """Sends a pre-serialized message to every client, dropping connections that fail."""
         # Filter out closed connections if any
         to_remove = []
         for connection in self.active_connections:
             try:
-                await connection.send_json(message)
+                await connection.send_text(payload)
             except Exception as e:
                 # Common error when client disconnects (refresh/close tab)
                 # Suppress warning to avoid log spam